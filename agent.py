@@ -1,30 +1,114 @@
 import logging
 import re
 import os
+import json
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable
 from datetime import datetime
-from ollama_client import OllamaClient, think_prepare_implement
+from ollama_client import (OllamaClient, think_prepare_implement, generation_options,
+                           GenerationCancelled, StepFailed)
 from file_manager import FileManager
+from file_history import FileHistory
 from web_client import WebClient
 from config import config
+from prefetch import Prefetcher
+from model_profile import select_model, route_steps
+from tracing import tracer, traced
+from log_config import correlated
 
 logger = logging.getLogger(__name__)
 
+# Max characters of a tool result fed back to the model
+TOOL_RESULT_LIMIT = 8000
+
+TOOL_SYSTEM_PROMPT = """You are a coding agent with access to tools. Call tools to inspect and change
+the workspace or fetch web content. Independent calls may be issued together in one turn.
+When the task is done, reply with a summary of what you did and any remaining steps."""
+
+
+def _tool(name: str, description: str, required: List[str], **properties) -> Dict[str, Any]:
+    """Describe a tool in Ollama's function-calling format."""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    prop: {"type": kind, "description": desc} for prop, (kind, desc) in properties.items()
+                },
+                "required": required,
+            },
+        },
+    }
+
+
+TOOL_SCHEMAS = [
+    _tool("create_file", "Create a file with the given content", ["filepath", "content"],
+          filepath=("string", "Path of the file"), content=("string", "Full file content"),
+          overwrite=("boolean", "Replace the file if it exists")),
+    _tool("edit_file", "Replace or append to an existing file", ["filepath", "content"],
+          filepath=("string", "Path of the file"), content=("string", "New content"),
+          append=("boolean", "Append instead of replacing")),
+    _tool("read_file", "Read a file", ["filepath"], filepath=("string", "Path of the file")),
+    _tool("list_files", "List files under a directory", [], directory=("string", "Directory to list")),
+    _tool("delete_file", "Delete a file", ["filepath"], filepath=("string", "Path of the file")),
+    _tool("search_files", "Search workspace files; returns matching lines as path:line: text", ["query"],
+          query=("string", "Text to find, or a regular expression if regex is true"),
+          regex=("boolean", "Treat query as a regular expression"),
+          path=("string", "Only search under this directory"),
+          case_sensitive=("boolean", "Match case exactly"),
+          max_results=("integer", "Maximum matching lines to return (default 50)")),
+    _tool("fetch_web", "Fetch the content of a URL", ["url"], url=("string", "URL to fetch")),
+    _tool("search_web", "Search the web", ["query"], query=("string", "Search query")),
+    _tool("set_model", "Switch the active Ollama model", ["model"], model=("string", "Model name")),
+]
+
 
 class Agent:
     """Main AI Agent for executing tasks."""
     
-    def __init__(self, model: str = None):
-        self.client = OllamaClient(model=model)
+    def __init__(self, model: str = None, client: OllamaClient = None,
+                 session_state: Dict[str, Any] = None, persist: bool = True, session_name: str = None,
+                 auto_execute: bool = True):
+        """
+        Args:
+            model: Model to use (ignored when `client` is given; with AUTO_MODEL the
+                fastest benchmarked model in MODEL_TIER is used when omitted)
+            client: Shared OllamaClient to reuse (e.g. across batch tasks)
+            session_state: Explicit session state instead of the persisted one
+            persist: Save session state to disk after changes
+            session_name: Named session to load and save (None = current session)
+            auto_execute: Write the code blocks of workflow results to files (off = return code only)
+        """
+        if client is None and model is None and config.auto_model:
+            model = select_model()
+            if model:
+                logger.info("⚡ Auto-selected model: %s (tier %s)", model, config.model_tier)
+        self.client = client or OllamaClient(model=model)
         self.file_manager = FileManager
+        self.history = FileHistory()
         self.web = WebClient
-        self.session_state = config.get_session_state()
+        self.persist = persist
+        self.session_name = session_name
+        self.auto_execute = auto_execute
+        if session_state is None:
+            session_state = config.get_session_state(session_name)
+        self.session_state = session_state
+        # Guards session_state mutation and persistence (tools may run concurrently)
+        self._state_lock = threading.RLock()
+        self._code_index = None  # Created on first search
         self.tools = {
             "create_file": self.create_file,
             "edit_file": self.edit_file,
             "read_file": self.read_file,
             "list_files": self.list_files,
+            "search_files": self.search_files,
             "delete_file": self.delete_file,
             "fetch_web": self.fetch_web,
             "search_web": self.search_web,
@@ -33,18 +117,22 @@ class Agent:
     
     def create_file(self, filepath: str, content: str, overwrite: bool = False) -> bool:
         """Create a file."""
-        result = self.file_manager.create_file(filepath, content, overwrite)
+        with self.history.changeset(f"create {filepath}"):
+            result = self.file_manager.create_file(filepath, content, overwrite)
         if result:
-            self.session_state["files_created"].append(filepath)
-            self._save_state()
+            with self._state_lock:
+                self.session_state["files_created"].append(filepath)
+                self._save_state()
         return result
     
     def edit_file(self, filepath: str, content: str, append: bool = False) -> bool:
         """Edit a file."""
-        result = self.file_manager.edit_file(filepath, content, append)
+        with self.history.changeset(f"edit {filepath}"):
+            result = self.file_manager.edit_file(filepath, content, append)
         if result:
-            self.session_state["files_modified"].append(filepath)
-            self._save_state()
+            with self._state_lock:
+                self.session_state["files_modified"].append(filepath)
+                self._save_state()
         return result
     
     def read_file(self, filepath: str) -> str:
@@ -57,9 +145,21 @@ class Agent:
         files = self.file_manager.list_files(directory)
         return "\n".join(files) if files else "No files found"
     
+    def search_files(self, query: str, regex: bool = False, path: str = None,
+                     case_sensitive: bool = False, max_results: int = 50) -> str:
+        """Search workspace files through the trigram index."""
+        from code_index import CodeIndex, format_matches
+        
+        if self._code_index is None:
+            self._code_index = CodeIndex()
+        matches, truncated = self._code_index.search(query, regex=regex, path=path,
+                                                     case_sensitive=case_sensitive, max_results=int(max_results))
+        return format_matches(matches, truncated)
+    
     def delete_file(self, filepath: str) -> bool:
         """Delete a file."""
-        return self.file_manager.delete_file(filepath)
+        with self.history.changeset(f"delete {filepath}"):
+            return self.file_manager.delete_file(filepath)
     
     def fetch_web(self, url: str) -> str:
         """Fetch web content."""
@@ -79,54 +179,400 @@ class Agent:
             return f"✅ Model switched to: {model}"
         return f"❌ Model not found. Available: {', '.join(models)}"
     
-    def execute(self, prompt: str, use_workflow: bool = True) -> Dict[str, Any]:
+    @correlated
+    @traced("execute")
+    def execute(self, prompt: str = None, use_workflow: bool = True,
+                on_step: Callable[[str, str], None] = None, use_tools: bool = False,
+                race: int = None, cancel_event: threading.Event = None,
+                resume: bool = False, on_cache_hit: Callable[[Dict[str, Any]], bool] = None) -> Dict[str, Any]:
         """
         Execute a task with the agent.
         
         Args:
             prompt: Task description
             use_workflow: Use think-prepare-implement workflow
+            on_step: Optional callback invoked with (step_name, output) as each step completes
+            use_tools: Let the model call tools in a chat loop instead of the workflow
+            race: Implement-step candidates to race concurrently (defaults to RACE_CANDIDATES)
+            cancel_event: When set, the workflow stops (closing the running step's stream)
+            resume: Continue the last unfinished task from its checkpoint instead of `prompt`
+            on_cache_hit: With SEMANTIC_CACHE=offer, called with a similar cached result
+                ({'prompt', 'similarity', 'result', ...}); return True to reuse it
         
         Returns:
             Execution result
         """
-        logger.info(f"🤖 Agent executing: {prompt[:50]}...")
+        if resume:
+            checkpoint = self._resume_checkpoint()
+            if not checkpoint:
+                return {"error": "Nothing to resume"}
+            prompt = checkpoint["prompt"]
+            context_prompt = checkpoint["context_prompt"]
+            use_workflow = checkpoint.get("use_workflow", use_workflow)
+            use_tools = checkpoint.get("use_tools", use_tools)
+        
+        logger.info("🤖 Agent executing: %.50s...", prompt)
         
         if not self.client.is_available():
             logger.error("❌ Ollama is not running!")
             return {"error": "Ollama not available"}
         
-        try:
+        if not resume:
             # Inject session context into prompt for continuity
             context_prompt = self._build_context_prompt(prompt)
-            
-            if use_workflow:
-                result = think_prepare_implement(context_prompt, client=self.client)
+            checkpoint = self._start_checkpoint(prompt, context_prompt, use_workflow, use_tools)
+        
+        cache_key = None
+        if config.semantic_cache != "off" and not resume and not use_tools:
+            cache_key, cached = self._check_cache(prompt, use_workflow, on_cache_hit)
+            if cached:
+                return self._finish_cached(prompt, cached, checkpoint, on_step)
+        
+        def record_step(name: str, text: str):
+            self._checkpoint_step(checkpoint, name, text)
+            if on_step:
+                on_step(name, text)
+        
+        try:
+            if use_tools:
+                # Files the model writes through tools form one undoable changeset
+                with self.history.changeset(prompt):
+                    result = self.run_tools(context_prompt)
+                if "error" in result:
+                    logger.error("❌ %s", result["error"])
+                    return result
+                if on_step:
+                    on_step("implementation", result["implementation"])
+            elif use_workflow:
+                # Fetch referenced URLs/files concurrently with the think step
+                prefetcher = Prefetcher(prompt).start() if config.prefetch else None
+                result = think_prepare_implement(context_prompt, client=self.client, on_step=record_step,
+                                                 race=race, cancel_event=cancel_event,
+                                                 checkpoint=checkpoint["steps"],
+                                                 extra_context=prefetcher.context if prefetcher else None,
+                                                 step_models=route_steps(self.client.host))
             else:
                 result = {
-                    "implementation": self.client.generate(context_prompt)
+                    "implementation": self.client.generate(
+                        context_prompt, options=generation_options("default", context_prompt)
+                    )
                 }
+                if on_step:
+                    on_step("implementation", result["implementation"])
         except Exception as e:
-            logger.error(f"❌ Agent execution failed: {e}")
-            return {"error": str(e)}
+            return self._execution_error(e, checkpoint)
+        
+        if cache_key:
+            self._store_cache(cache_key, prompt, result)
+        return self._finish_execution(prompt, result, checkpoint, use_tools)
+    
+    @correlated
+    async def aexecute(self, prompt: str = None, use_workflow: bool = True,
+                       on_step: Callable[[str, str], None] = None, race: int = None,
+                       cancel_event: threading.Event = None, resume: bool = False,
+                       client=None, on_cache_hit: Callable[[Dict[str, Any]], bool] = None) -> Dict[str, Any]:
+        """
+        Execute a task on the event loop (async counterpart of execute, without tool mode).
+        
+        Generations await an AsyncOllamaClient instead of blocking a thread; pass one
+        `client` shared across many agents/tasks so they reuse one connection pool.
+        Session bookkeeping (checkpoints, file writes, state saves) is the same as execute.
+        
+        Args:
+            client: AsyncOllamaClient to use (a temporary one is created if omitted)
+            (other arguments as for execute)
+        
+        Returns:
+            Execution result
+        """
+        from async_client import AsyncOllamaClient, async_think_prepare_implement
+        
+        if resume:
+            checkpoint = self._resume_checkpoint()
+            if not checkpoint:
+                return {"error": "Nothing to resume"}
+            prompt = checkpoint["prompt"]
+            context_prompt = checkpoint["context_prompt"]
+            use_workflow = checkpoint.get("use_workflow", use_workflow)
+        
+        logger.info("🤖 Agent executing: %.50s...", prompt)
+        owns_client = client is None
+        client = client or AsyncOllamaClient(host=self.client.host, model=self.client.model)
+        
+        try:
+            if not await client.is_available():
+                logger.error("❌ Ollama is not running!")
+                return {"error": "Ollama not available"}
+            
+            if not resume:
+                context_prompt = self._build_context_prompt(prompt)
+                checkpoint = self._start_checkpoint(prompt, context_prompt, use_workflow, False)
+            
+            cache_key = None
+            if config.semantic_cache != "off" and not resume:
+                cache_key, cached = await asyncio.to_thread(self._check_cache, prompt, use_workflow, on_cache_hit)
+                if cached:
+                    return self._finish_cached(prompt, cached, checkpoint, on_step)
+            
+            def record_step(name: str, text: str):
+                self._checkpoint_step(checkpoint, name, text)
+                if on_step:
+                    on_step(name, text)
+            
+            try:
+                if use_workflow:
+                    prefetcher = Prefetcher(prompt).start() if config.prefetch else None
+                    result = await async_think_prepare_implement(
+                        context_prompt, client=client, on_step=record_step, race=race,
+                        cancel_event=cancel_event, checkpoint=checkpoint["steps"],
+                        # Prefetching runs on its own threads; wait for it off the loop
+                        extra_context=(lambda: asyncio.to_thread(prefetcher.context)) if prefetcher else None,
+                        step_models=route_steps(client.host))
+                else:
+                    result = {
+                        "implementation": await client.generate(
+                            context_prompt, options=generation_options("default", context_prompt)
+                        )
+                    }
+                    if on_step:
+                        on_step("implementation", result["implementation"])
+            except Exception as e:
+                return self._execution_error(e, checkpoint)
+        finally:
+            if owns_client:
+                await client.close()
+        
+        if cache_key:
+            await asyncio.to_thread(self._store_cache, cache_key, prompt, result)
+        return self._finish_execution(prompt, result, checkpoint, False)
+    
+    def _check_cache(self, prompt: str, use_workflow: bool,
+                     on_cache_hit: Callable[[Dict[str, Any]], bool] = None) -> tuple:
+        """
+        Look the prompt up in the semantic cache.
+        
+        Returns:
+            (cache_key, cached_result): cache_key is (vector, scope) for storing the new
+            result later (None if embedding failed); cached_result is the result to reuse, or None
+        """
+        from semantic_cache import get_cache
         
+        cache = get_cache()
+        vector = cache.embed(self.client, prompt)
+        if vector is None:
+            return None, None
+        # Prompts like "add tests" mean different things per project: scope entries to the
+        # workspace so answers never cross into another tree. Not to the project context,
+        # which changes after every task that creates files.
+        scope = f"{self.client.model}|{'workflow' if use_workflow else 'single'}|{Path.cwd().resolve()}"
+        hit = cache.lookup(vector, scope)
+        if hit:
+            logger.info("🗃️  Similar cached prompt (%.2f): %.50s", hit['similarity'], hit['prompt'])
+            if config.semantic_cache == "return" or (on_cache_hit and on_cache_hit(hit)):
+                return (vector, scope), {**hit["result"],
+                                         "cached": {"prompt": hit["prompt"], "similarity": hit["similarity"]}}
+        return (vector, scope), None
+    
+    def _store_cache(self, cache_key: tuple, prompt: str, result: Dict[str, Any]):
+        from semantic_cache import get_cache
+        
+        vector, scope = cache_key
+        get_cache().add(vector, prompt, scope, result)
+    
+    def _finish_cached(self, prompt: str, result: Dict[str, Any], checkpoint: Dict[str, Any],
+                       on_step: Callable[[str, str], None] = None) -> Dict[str, Any]:
+        """Replay a cached result's steps and apply it like a fresh one."""
+        logger.info("♻️  Reusing cached result")
+        if on_step:
+            for name in ("thinking", "plan", "implementation"):
+                if name in result:
+                    on_step(name, result[name])
+        return self._finish_execution(prompt, result, checkpoint, False)
+    
+    def _resume_checkpoint(self) -> Dict[str, Any]:
+        """Return the unfinished task's checkpoint, or None."""
+        checkpoint = self.session_state.get("checkpoint")
+        if checkpoint:
+            logger.info("⏩ Resuming: %.50s... (%s done)",
+                        checkpoint['prompt'], ', '.join(checkpoint['steps']) or 'no steps')
+        return checkpoint
+    
+    def _execution_error(self, error: Exception, checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the result for a failed or cancelled execution (completed steps stay checkpointed)."""
+        if isinstance(error, GenerationCancelled):
+            logger.info("🛑 Execution cancelled")
+            result = {"error": str(error), "cancelled": True, **checkpoint["steps"]}
+            if error.partial:
+                # Keep the interrupted step's output with the checkpoint
+                result["partial"] = {"step": error.step, "text": error.partial}
+                with self._state_lock:
+                    checkpoint["partial"] = result["partial"]
+                    self._save_state()
+            return result
+        if isinstance(error, StepFailed):
+            logger.error("❌ %s; completed steps are checkpointed", error)
+            return {"error": f"{error}. Run 'resume' to continue from the last completed step.",
+                    **checkpoint["steps"]}
+        logger.error("❌ Agent execution failed: %s", error)
+        return {"error": str(error)}
+    
+    def _finish_execution(self, prompt: str, result: Dict[str, Any], checkpoint: Dict[str, Any],
+                          use_tools: bool) -> Dict[str, Any]:
+        """Apply a finished result: create files, record the message, clear the checkpoint."""
         # Auto-execute: Parse and create files/folders from implementation
-        if "implementation" in result:
-            self._auto_execute(result["implementation"])
+        # (in tool mode the model already acted through tool calls)
+        if "implementation" in result and not use_tools and self.auto_execute:
+            with self.history.changeset(prompt):
+                self._auto_execute(result["implementation"])
         
-        # Store in session
-        self.session_state["messages"].append({
+        with self._state_lock:
+            # Store in session
+            self.session_state["messages"].append({
+                "prompt": prompt,
+                "result": result,
+                "timestamp": datetime.now().isoformat()
+            })
+            
+            # Update project context based on what was created
+            self._update_project_context()
+            # Task finished: nothing left to resume (unless another task has started since)
+            if self.session_state.get("checkpoint") is checkpoint:
+                self.session_state.pop("checkpoint")
+            self._save_state()
+        
+        return result
+    
+    def _start_checkpoint(self, prompt: str, context_prompt: str, use_workflow: bool,
+                          use_tools: bool) -> Dict[str, Any]:
+        """Record a new in-progress task in the session so it can be resumed."""
+        checkpoint = {
             "prompt": prompt,
-            "result": result,
-            "timestamp": datetime.now().isoformat()
-        })
+            "context_prompt": context_prompt,
+            "use_workflow": use_workflow,
+            "use_tools": use_tools,
+            "steps": {},
+            "started": datetime.now().isoformat(),
+        }
+        with self._state_lock:
+            self.session_state["checkpoint"] = checkpoint
+            self._save_state()
+        return checkpoint
+    
+    def _checkpoint_step(self, checkpoint: Dict[str, Any], name: str, text: str):
+        """Persist a completed workflow step."""
+        if name == "implementation" or checkpoint["steps"].get(name) == text:
+            return  # Final output is stored with the message; restored steps need no save
+        with self._state_lock:
+            checkpoint["steps"][name] = text
+            self._save_state()
+    
+    @traced("tool_loop")
+    def run_tools(self, prompt: str, max_turns: int = None) -> Dict[str, Any]:
+        """
+        Run a tool-calling loop: the model requests tools, the agent runs them and feeds results back.
         
-        # Update project context based on what was created
-        self._update_project_context()
-        self._save_state()
+        Args:
+            prompt: Task prompt (with session context)
+            max_turns: Maximum model turns before giving up
         
-        return result
+        Returns:
+            Dictionary with 'implementation' (final answer) and 'tool_calls' (log of calls made)
+        """
+        messages = [
+            {"role": "system", "content": TOOL_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+        calls_made = []
+        
+        for _ in range(max_turns or config.max_tool_turns):
+            # Size num_ctx from the whole conversation: tool results grow it every turn
+            conversation = json.dumps(TOOL_SCHEMAS) + "".join(
+                (m.get("content") or "") + json.dumps(m.get("tool_calls") or "") for m in messages)
+            message = self.client.chat(messages, tools=TOOL_SCHEMAS,
+                                       options=generation_options("implement", conversation))
+            tool_calls = message.get("tool_calls") or []
+            messages.append(message)
+            
+            if not tool_calls:
+                return {"implementation": message.get("content", "").strip(), "tool_calls": calls_made}
+            
+            results = self._run_tool_calls(tool_calls)
+            for call, output in zip(tool_calls, results):
+                function = call.get("function", {})
+                calls_made.append({"name": function.get("name"), "arguments": function.get("arguments")})
+                messages.append({"role": "tool", "tool_name": function.get("name"), "content": output})
+        
+        logger.warning("⚠️  Tool loop stopped after reaching the turn limit")
+        answer = next((m.get("content", "").strip() for m in reversed(messages)
+                       if m.get("role") == "assistant" and m.get("content", "").strip()), "")
+        if not answer:
+            return {"error": "Tool loop reached the turn limit without an answer", "tool_calls": calls_made}
+        return {"implementation": answer, "tool_calls": calls_made}
     
+    def _run_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Execute one turn's tool calls concurrently.
+        
+        Calls touching the same file (or switching models) are dependent and run in
+        order within one worker; everything else runs in parallel.
+        
+        Returns:
+            Tool outputs in the same order as `tool_calls`
+        """
+        groups: Dict[Any, List[int]] = {}
+        for index, call in enumerate(tool_calls):
+            function = call.get("function", {})
+            args = function.get("arguments") or {}
+            if function.get("name") == "set_model":
+                key = "set_model"
+            elif "filepath" in args:
+                key = os.path.abspath(str(args["filepath"]))
+            else:
+                key = index  # Independent
+            groups.setdefault(key, []).append(index)
+        
+        results: List[str] = [""] * len(tool_calls)
+        
+        def run_group(indices: List[int]):
+            for index in indices:
+                results[index] = self._call_tool(tool_calls[index].get("function", {}))
+        
+        with ThreadPoolExecutor(max_workers=min(config.tool_workers, len(groups))) as pool:
+            # Each worker runs in a copy of this context, keeping the correlation id and trace stack
+            futures = [pool.submit(contextvars.copy_context().run, run_group, group) for group in groups.values()]
+            for future in futures:
+                future.result()
+        
+        return results
+    
+    def _call_tool(self, function: Dict[str, Any]) -> str:
+        """Invoke one tool and render its result for the model."""
+        name = function.get("name")
+        args = function.get("arguments") or {}
+        if isinstance(args, str):
+            try:
+                args = json.loads(args)
+            except json.JSONDecodeError:
+                return f"Error: arguments for {name} are not valid JSON"
+        
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Error: unknown tool {name}"
+        
+        with tracer.span(f"tool:{name}"):
+            try:
+                logger.info("🔧 Tool call: %s(%s)", name, ', '.join(args))
+                output = tool(**args)
+            except Exception as e:
+                logger.error("❌ Tool %s failed: %s", name, e)
+                return f"Error: {e}"
+        
+        text = str(output)
+        if len(text) > TOOL_RESULT_LIMIT:
+            text = text[:TOOL_RESULT_LIMIT] + f"\n... [truncated {len(text) - TOOL_RESULT_LIMIT} chars]"
+        return text
+    
+    @traced("build_context_prompt")
     def _build_context_prompt(self, prompt: str) -> str:
         """Build prompt with session context for memory."""
         context_parts = []
@@ -161,6 +607,7 @@ class Agent:
             )
     
     
+    @traced("auto_execute")
     def _auto_execute(self, implementation: str):
         """
         Parse implementation and auto-execute file/folder creation.
@@ -168,30 +615,32 @@ class Agent:
         """
         logger.info("🔨 Auto-executing generated code...")
         
-        # Pattern: Look for "mkdir Calc" - handle backticks
-        mkdir_pattern = r'`?mkdir\s+([a-zA-Z0-9_\-\.]+)`?'
-        mkdir_matches = re.findall(mkdir_pattern, implementation)
+        with tracer.span("auto_execute:parse"):
+            # Pattern: Look for "mkdir Calc" - handle backticks
+            mkdir_pattern = r'`?mkdir\s+([a-zA-Z0-9_\-\.]+)`?'
+            mkdir_matches = re.findall(mkdir_pattern, implementation)
+            
+            # Pattern: Code blocks with language specifiers
+            code_block_pattern = r'```(?:python|py|javascript|js|json|yaml|yml|bash|sh|html|css|dockerfile)?\n(.*?)```'
+            code_blocks = re.findall(code_block_pattern, implementation, re.DOTALL)
+            
+            # Pattern: Look for file names mentioned - be specific
+            file_pattern = r'([a-zA-Z0-9_\-]+\.(?:py|js|json|txt|html|css|yaml|yml|md|sh))'
+            file_matches = re.findall(file_pattern, implementation)
         
         # Filter out false positives (single letters, numbers)
         directories = [d for d in set(mkdir_matches) if len(d) > 1]
         
         if directories:
-            logger.info(f"📂 Found directories: {', '.join(directories)}")
-        
-        # Pattern: Code blocks with language specifiers
-        code_block_pattern = r'```(?:python|py|javascript|js|json|yaml|yml|bash|sh|html|css|dockerfile)?\n(.*?)```'
-        code_blocks = re.findall(code_block_pattern, implementation, re.DOTALL)
+            logger.info("📂 Found directories: %s", ', '.join(directories))
         
         if code_blocks:
-            logger.info(f"📄 Found {len(code_blocks)} code blocks")
+            logger.info("📄 Found %s code blocks", len(code_blocks))
         
-        # Pattern: Look for file names mentioned - be specific
-        file_pattern = r'([a-zA-Z0-9_\-]+\.(?:py|js|json|txt|html|css|yaml|yml|md|sh))'
-        file_matches = re.findall(file_pattern, implementation)
         files_to_create = list(set(file_matches))
         
         if files_to_create:
-            logger.info(f"📋 Found files: {', '.join(files_to_create)}")
+            logger.info("📋 Found files: %s", ', '.join(files_to_create))
         
         # Create directories first
         home = os.path.expanduser("~")
@@ -202,10 +651,10 @@ class Agent:
             
             try:
                 Path(dir_path).mkdir(parents=True, exist_ok=True)
-                logger.info(f"✅ Created directory: {dir_path}")
+                logger.info("✅ Created directory: %s", dir_path)
                 created_dirs.append(dir_path)
             except Exception as e:
-                logger.error(f"❌ Failed to create directory {dir_path}: {e}")
+                logger.error("❌ Failed to create directory %s: %s", dir_path, e)
         
         # Create files with code blocks in the created directories
         if code_blocks and created_dirs:
@@ -224,9 +673,9 @@ class Agent:
                     content = code.strip()
                     
                     if self.create_file(filepath, content, overwrite=True):
-                        logger.info(f"✅ Auto-created file: {filepath}")
+                        logger.info("✅ Auto-created file: %s", filepath)
                 except Exception as e:
-                    logger.error(f"❌ Failed to create file: {e}")
+                    logger.error("❌ Failed to create file: %s", e)
                     continue
         elif code_blocks and not created_dirs:
             # No directories found, create in current directory
@@ -234,14 +683,17 @@ class Agent:
                 try:
                     filename = f"calculator_{i}.py" if "tkinter" in code.lower() else f"file_{i}.py"
                     if self.create_file(filename, code.strip(), overwrite=True):
-                        logger.info(f"✅ Auto-created file: {filename}")
+                        logger.info("✅ Auto-created file: %s", filename)
                 except Exception as e:
-                    logger.error(f"❌ Failed to create file: {e}")
+                    logger.error("❌ Failed to create file: %s", e)
                     continue
     
     def _save_state(self):
         """Save session state."""
-        config.save_session_state(self.session_state)
+        if not self.persist:
+            return
+        with self._state_lock:
+            config.save_session_state(self.session_state, self.session_name)
     
     def get_available_models(self) -> List[str]:
         """Get list of available models."""
@@ -257,6 +709,7 @@ class Agent:
 ║ Ollama Host:      {self.client.host:<20}
 ║ Active Model:     {self.client.model:<20}
 ║ Models Available: {len(models):<20}
+║ Concurrency:      {self.client.limiter.snapshot()['limit']:<20}
 ║ Files Created:    {len(self.session_state['files_created']):<20}
 ║ Files Modified:   {len(self.session_state['files_modified']):<20}
 ║ Messages:         {len(self.session_state['messages']):<20}
@@ -0,0 +1,112 @@
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from agent import Agent
+from ollama_client import OllamaClient
+from config import config
+from transport import new_session
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPool:
+    """
+    Serve many isolated sessions from one process.
+
+    Each session gets its own Agent with its own session state, model choice and
+    persistence file, while all sessions share one HTTP connection pool and the
+    per-host concurrency limiter. Requests for the same session run one at a time;
+    different sessions run concurrently.
+    """
+
+    def __init__(self, model: str = None, host: str = None, max_sessions: int = 64, persist: bool = True):
+        """
+        Args:
+            model: Default model for new sessions
+            host: Ollama host (defaults to config.ollama_host)
+            max_sessions: Sessions kept in memory; least recently used ones are evicted
+            persist: Save each session's state under the state directory
+        """
+        self.model = model or config.default_model
+        self.host = host or config.ollama_host
+        self.max_sessions = max_sessions
+        self.persist = persist
+        self.http = new_session()
+        self._agents: "OrderedDict[Optional[str], Agent]" = OrderedDict()
+        self._session_locks: Dict[Optional[str], threading.RLock] = {}
+        self._lock = threading.Lock()
+
+    def _new_agent(self, session_id: Optional[str]) -> Agent:
+        # Per-session client object (own model setting) over the shared HTTP pool;
+        # never unload models on switch since other sessions may be using them
+        client = OllamaClient(host=self.host, model=self.model, session=self.http, unload_on_switch=False)
+        if self.persist:
+            return Agent(client=client, session_name=session_id)
+        return Agent(client=client, session_state=config.create_blank_state(), persist=False)
+
+    def agent(self, session_id: Optional[str] = None) -> Agent:
+        """Get (or load) the Agent for a session (None = the default current session)."""
+        with self._lock:
+            agent = self._agents.get(session_id)
+            if agent is None:
+                agent = self._new_agent(session_id)
+                self._agents[session_id] = agent
+                self._session_locks.setdefault(session_id, threading.RLock())
+            self._agents.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return agent
+
+    def _evict(self, keep: Optional[str]):
+        """Drop least recently used idle sessions beyond max_sessions (their state is already saved)."""
+        for session_id in list(self._agents):
+            if len(self._agents) <= self.max_sessions:
+                break
+            if session_id == keep:
+                continue
+            lock = self._session_locks[session_id]
+            if not lock.acquire(blocking=False):
+                continue  # A request is running on this session
+            try:
+                del self._agents[session_id]
+                del self._session_locks[session_id]
+                logger.debug("Evicted session %s from memory", session_id)
+            finally:
+                lock.release()
+
+    @contextmanager
+    def session_lock(self, session_id: Optional[str]):
+        """Hold the lock serializing requests within one session."""
+        while True:
+            with self._lock:
+                lock = self._session_locks.setdefault(session_id, threading.RLock())
+            with lock:
+                # Evicted while we waited: its lock is gone, so take the session's new one
+                if self._session_locks.get(session_id) is lock:
+                    yield
+                    return
+
+    def execute(self, session_id: Optional[str], prompt: str = None, **kwargs) -> Dict[str, Any]:
+        """
+        Run Agent.execute for one session.
+
+        Args:
+            session_id: Session name (letters, digits, '.', '_' and '-'), or None for the current session
+            prompt: Task description
+            **kwargs: Extra arguments for Agent.execute
+
+        Returns:
+            Execution result
+        """
+        with self.session_lock(session_id):
+            return self.agent(session_id).execute(prompt, **kwargs)
+
+    def sessions(self) -> List[Optional[str]]:
+        """Sessions currently held in memory."""
+        with self._lock:
+            return list(self._agents)
+
+    def close(self):
+        """Release pooled connections."""
+        self.http.close()
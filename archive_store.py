@@ -0,0 +1,181 @@
+import json
+import zlib
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from atomic_write import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Strings at least this long are stored as shared blobs instead of inline in manifests
+BLOB_MIN_CHARS = 256
+
+BLOB_KEY = "$blob"
+
+
+class ArchiveStore:
+    """
+    Compressed, content-addressed store for archived sessions.
+
+    Each archive is a small JSON manifest: summary fields for listings plus the session
+    state with every long string (thinking, plans, implementations, prompts with context)
+    replaced by a reference to a zlib-compressed blob named by its SHA-256. Identical
+    payloads across sessions are stored once, and listing or inspecting archives reads
+    only manifests; blobs are loaded when a full session is requested.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Store directory (holds manifests/ and blobs/)
+        """
+        self.root = Path(root)
+        self.manifests_dir = self.root / "manifests"
+        self.blobs_dir = self.root / "blobs"
+
+    def archive(self, state: Dict[str, Any], name: str = None, archived_at: datetime = None,
+                archive_id: str = None) -> Path:
+        """
+        Archive a session state.
+
+        Args:
+            state: Session state to store
+            name: Session name recorded in the manifest (None = default session)
+            archived_at: Archive time (defaults to now)
+            archive_id: Explicit archive id (defaults to one derived from name and time)
+
+        Returns:
+            Path of the new manifest
+        """
+        archived_at = archived_at or datetime.now()
+        if archive_id is None:
+            archive_id = archived_at.strftime('%Y%m%d_%H%M%S_%f')
+            if name:
+                archive_id = f"{name}_{archive_id}"
+
+        manifest = {
+            "id": archive_id,
+            "name": name,
+            "archived_at": archived_at.isoformat(),
+            "summary": summarize(state),
+            "state": self._externalize(state),
+        }
+        path = self.manifests_dir / f"{archive_id}.json"
+        write_atomic(path, json.dumps(manifest).encode())
+        return path
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of all archives, newest first (reads manifests only)."""
+        archives = []
+        for path in sorted(self.manifests_dir.glob("*.json"), reverse=True):
+            try:
+                manifest = self._read_manifest(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable archive %s: %s", path.name, e)
+                continue
+            archives.append({"id": manifest["id"], "name": manifest.get("name"),
+                             "archived_at": manifest["archived_at"], **manifest["summary"]})
+        archives.sort(key=lambda a: a["archived_at"], reverse=True)
+        return archives
+
+    def info(self, archive_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of one archive, without loading any blobs."""
+        manifest = self._manifest(archive_id)
+        if manifest is None:
+            return None
+        return {"id": manifest["id"], "name": manifest.get("name"),
+                "archived_at": manifest["archived_at"], **manifest["summary"]}
+
+    def load(self, archive_id: str) -> Optional[Dict[str, Any]]:
+        """Full session state of an archive (blobs are read and decompressed here)."""
+        manifest = self._manifest(archive_id)
+        if manifest is None:
+            return None
+        return self._internalize(manifest["state"])
+
+    def import_json(self, path: Path) -> Path:
+        """
+        Move a legacy pretty-printed session_*.json archive into the store.
+
+        Returns:
+            Path of the new manifest (the JSON file is deleted once stored)
+        """
+        path = Path(path)
+        with open(path, 'r') as f:
+            state = json.load(f)
+        # Keep the file's timestamp-based id and time so listings stay in order
+        try:
+            archived_at = datetime.strptime(path.stem, "session_%Y%m%d_%H%M%S")
+        except ValueError:
+            archived_at = datetime.fromtimestamp(path.stat().st_mtime)
+        manifest = self.archive(state, archived_at=archived_at, archive_id=path.stem.replace("session_", "", 1))
+        path.unlink()
+        return manifest
+
+    def size(self) -> int:
+        """Bytes used on disk by manifests and blobs."""
+        return sum(p.stat().st_size for p in self.root.rglob("*") if p.is_file())
+
+    def _manifest(self, archive_id: str) -> Optional[Dict[str, Any]]:
+        path = self.manifests_dir / f"{archive_id}.json"
+        if not path.exists():
+            return None
+        return self._read_manifest(path)
+
+    @staticmethod
+    def _read_manifest(path: Path) -> Dict[str, Any]:
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest
+
+    def put_blob(self, text: str) -> str:
+        """Store a string once; return its SHA-256 digest."""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            write_atomic(path, zlib.compress(data, 6))
+        return digest
+
+    def get_blob(self, digest: str) -> str:
+        """Read and decompress a blob."""
+        with open(self._blob_path(digest), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    def _externalize(self, value: Any) -> Any:
+        """Replace long strings with blob references, recursively."""
+        if isinstance(value, str) and len(value) >= BLOB_MIN_CHARS:
+            return {BLOB_KEY: self.put_blob(value)}
+        if isinstance(value, dict):
+            return {k: self._externalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._externalize(v) for v in value]
+        return value
+
+    def _internalize(self, value: Any) -> Any:
+        """Resolve blob references back into strings, recursively."""
+        if isinstance(value, dict):
+            if set(value) == {BLOB_KEY}:
+                return self.get_blob(value[BLOB_KEY])
+            return {k: self._internalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._internalize(v) for v in value]
+        return value
+
+
+def summarize(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Small summary of a session for listings and session info."""
+    messages = state.get("messages", [])
+    return {
+        "session_start": state.get("session_start"),
+        "messages": len(messages),
+        "files_created": state.get("files_created", [])[-10:],
+        "files_created_count": len(state.get("files_created", [])),
+        "files_modified_count": len(state.get("files_modified", [])),
+        "project_context": (state.get("project_context") or "")[:200],
+        "last_prompt": messages[-1].get("prompt", "")[:100] if messages else "",
+    }
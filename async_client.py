@@ -0,0 +1,383 @@
+"""
+Asyncio counterparts of OllamaClient, WebClient and the think-prepare-implement
+workflow, so a single event loop can drive many concurrent generations and
+fetches without a thread per in-flight request.
+"""
+
+import json
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable, List, AsyncIterator
+import aiohttp
+from config import config
+from limiter import AdaptiveLimiter, limiter_for
+from ollama_client import (THINK_PROMPT, PREPARE_PROMPT, IMPLEMENT_PROMPT, generation_options,
+                           is_valid_implementation, _check_cancelled, _check_output)
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'CLIAgent/1.0'
+
+
+def _check_no_cassette():
+    """
+    Refuse to run the async clients while a cassette is configured.
+
+    aiohttp does not go through transport.py, so a cassette could neither record nor
+    replay this traffic; failing is better than silently hitting the live network.
+
+    Raises:
+        RuntimeError if a cassette (--record/--replay, AGENT_CASSETTE) is configured
+    """
+    if config.cassette:
+        raise RuntimeError("Record/replay is not supported by the asyncio clients; "
+                           "use Agent.execute to record or replay a cassette")
+
+
+class AsyncOllamaClient:
+    """Async client for a local Ollama server (one aiohttp connection pool per client)."""
+
+    def __init__(self, host: str = None, model: str = None):
+        _check_no_cassette()
+        self.host = host or config.ollama_host
+        self.model = model or config.default_model
+        self.api_endpoint = f"{self.host}/api/generate"
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Largest num_ctx sent per model; never shrunk, since a change forces a reload
+        self._num_ctx: Dict[str, int] = {}
+        # Same per-host AIMD limit as the sync client, awaited instead of blocking
+        if config.adaptive_concurrency:
+            self.limiter = limiter_for(self.host)
+        else:
+            self.limiter = AdaptiveLimiter(initial=10**6, maximum=10**6, target_delay=float('inf'))
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """HTTP session, created on first use inside the running event loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30000))
+        return self._session
+
+    async def close(self):
+        """Close pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> "AsyncOllamaClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def list_models(self) -> List[str]:
+        """List available models on Ollama."""
+        try:
+            async with self.session.get(f"{self.host}/api/tags", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                response.raise_for_status()
+                data = await response.json()
+                return [m['name'] for m in data.get('models', [])]
+        except Exception as e:
+            logger.error("Failed to list models: %s", e)
+            return []
+
+    async def is_available(self) -> bool:
+        """Check if Ollama is running and accessible."""
+        try:
+            async with self.session.get(f"{self.host}/api/tags", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return response.status == 200
+        except Exception as e:
+            logger.warning("Ollama not available: %s", e)
+            return False
+
+    def _stable_options(self, model: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Round num_ctx up to the largest value already used for this model."""
+        if "num_ctx" not in options:
+            return options
+        num_ctx = max(options["num_ctx"], self._num_ctx.get(model, 0))
+        self._num_ctx[model] = num_ctx
+        return {**options, "num_ctx": num_ctx}
+
+    def _payload(self, prompt: str, model: str, options: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": config.keep_alive_for(model),
+            "options": self._stable_options(model, options or {}),
+        }
+
+    async def generate(self, prompt: str, model: str = None, options: Dict[str, Any] = None) -> str:
+        """
+        Generate text using Ollama.
+
+        Args:
+            prompt: The input prompt
+            model: Optional model override
+            options: Ollama generation options (num_ctx, num_predict, stop, temperature, ...)
+
+        Returns:
+            Generated text ("" on failure)
+        """
+        try:
+            return (await self.generate_stats(prompt, model, options))['response'].strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Generation failed: %s", e)
+            return ""
+
+    async def generate_stats(self, prompt: str, model: str = None,
+                             options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Generate without streaming and return Ollama's full response (text plus timings).
+
+        Raises:
+            aiohttp.ClientError on connection or HTTP errors
+        """
+        model = model or self.model
+        async with self.limiter.aslot() as slot:
+            with tracer.span("http:generate", model=model, prompt_chars=len(prompt)):
+                async with self.session.post(self.api_endpoint,
+                                             json=self._payload(prompt, model, options, False)) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+                    slot.record(data)
+                    return data
+
+    async def stream(self, prompt: str, model: str = None, options: Dict[str, Any] = None,
+                     cancel_event: threading.Event = None) -> AsyncIterator[str]:
+        """
+        Stream generated text chunk by chunk.
+
+        Stopping iteration early (or cancelling the consuming task) closes the HTTP
+        stream so Ollama stops generating.
+
+        Args:
+            prompt: The input prompt
+            model: Optional model override
+            options: Ollama generation options
+            cancel_event: When set, the stream is closed before the next chunk
+
+        Yields:
+            Response text chunks as they arrive
+
+        Raises:
+            aiohttp.ClientError on connection or HTTP errors
+        """
+        model = model or self.model
+        async with self.limiter.aslot() as slot:
+            async with self.session.post(self.api_endpoint,
+                                         json=self._payload(prompt, model, options, True)) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        slot.mark_first_token()
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        slot.record(chunk)
+                        break
+
+
+class AsyncWebClient:
+    """Async client for web access and searching (one connection pool per client)."""
+
+    def __init__(self):
+        _check_no_cassette()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """HTTP session, created on first use inside the running event loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={'User-Agent': USER_AGENT})
+        return self._session
+
+    async def close(self):
+        """Close pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> "AsyncWebClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def fetch(self, url: str, timeout: int = 10) -> Optional[str]:
+        """
+        Fetch content from a URL.
+
+        Args:
+            url: The URL to fetch
+            timeout: Request timeout in seconds
+
+        Returns:
+            Page content or None on error
+        """
+        try:
+            with tracer.span("http:fetch", url=url):
+                async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    response.raise_for_status()
+                    return await response.text()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Failed to fetch %s: %s", url, e)
+            return None
+
+    async def search(self, query: str) -> Optional[str]:
+        """
+        Search the web (basic implementation with DuckDuckGo).
+
+        Args:
+            query: Search query
+
+        Returns:
+            Search results
+        """
+        try:
+            with tracer.span("http:search"):
+                async with self.session.get("https://html.duckduckgo.com/", params={"q": query},
+                                            timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    response.raise_for_status()
+                    logger.info("Search results fetched for: %s", query)
+                    return (await response.text())[:5000]  # Limit response size
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Search failed: %s", e)
+            return None
+
+
+async def async_race_generate(prompt: str, clients: List[AsyncOllamaClient], candidates: int,
+                              model: str = None, options: Dict[str, Any] = None,
+                              validator: Callable[[str], bool] = is_valid_implementation) -> str:
+    """
+    Async variant of race_generate: run candidates as tasks, return the first valid one
+    and cancel the rest (closing their streams).
+
+    Returns:
+        The first valid candidate, or the first completed one if none validate
+    """
+    async def run(index: int) -> str:
+        client = clients[index % len(clients)]
+        seeded = {**(options or {}), "seed": index + 1}
+        return "".join([chunk async for chunk in client.stream(prompt, model, seeded)]).strip()
+
+    tasks = [asyncio.ensure_future(run(i)) for i in range(candidates)]
+    fallback = ""
+    try:
+        for position, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            try:
+                text = await next_done
+            except Exception as e:
+                logger.warning("Race candidate failed: %s", e)
+                continue
+            if validator(text):
+                logger.info("🏁 Race won by the %s. finished candidate of %s", position, candidates)
+                return text
+            fallback = fallback or text
+        logger.warning("No race candidate passed validation, using the first completed one")
+        return fallback
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def async_think_prepare_implement(prompt: str, model: str = None, client: AsyncOllamaClient = None,
+                                        on_step: Callable[[str, str], None] = None, race: int = None,
+                                        cancel_event: threading.Event = None,
+                                        checkpoint: Dict[str, str] = None,
+                                        extra_context: Callable[[], Any] = None,
+                                        step_models: Dict[str, str] = None) -> Dict[str, str]:
+    """
+    Execute the think-prepare-implement workflow on the event loop.
+
+    Takes the same arguments as think_prepare_implement; `extra_context` may also be
+    a coroutine function. Cancelling the calling task stops the in-flight request.
+
+    Returns:
+        Dictionary with 'thinking', 'plan', and 'implementation' keys
+
+    Raises:
+        GenerationCancelled if `cancel_event` is set
+        StepFailed if a step produces no output
+    """
+    owns_client = client is None
+    client = client or AsyncOllamaClient()
+    model = model or client.model
+    step_models = step_models or {}
+    checkpoint = checkpoint or {}
+
+    try:
+        think_prompt = THINK_PROMPT.format(prompt=prompt)
+        if checkpoint.get("thinking"):
+            thinking = checkpoint["thinking"]
+            logger.info("⏩ Thinking restored from checkpoint")
+        else:
+            _check_cancelled(cancel_event)
+            with tracer.span("step:think"):
+                thinking = await client.generate(think_prompt, step_models.get("think", model),
+                                                 options=generation_options("think", think_prompt))
+            _check_output("thinking", thinking)
+            logger.info("💭 Thinking: %.100s...", thinking)
+        if on_step:
+            on_step("thinking", thinking)
+
+        references = extra_context() if extra_context else ""
+        if inspect.isawaitable(references):
+            references = await references
+        references = f"\n\nREFERENCED CONTENT:\n{references}" if references else ""
+
+        prepare_prompt = PREPARE_PROMPT.format(thinking=thinking, references=references)
+        if checkpoint.get("plan"):
+            plan = checkpoint["plan"]
+            logger.info("⏩ Plan restored from checkpoint")
+        else:
+            _check_cancelled(cancel_event)
+            with tracer.span("step:prepare"):
+                plan = await client.generate(prepare_prompt, step_models.get("prepare", model),
+                                             options=generation_options("prepare", prepare_prompt))
+            _check_output("plan", plan)
+            logger.info("📋 Plan: %.100s...", plan)
+        if on_step:
+            on_step("plan", plan)
+
+        implement_prompt = IMPLEMENT_PROMPT.format(plan=plan, references=references)
+        _check_cancelled(cancel_event)
+        race = config.race_candidates if race is None else race
+        implement_options = generation_options("implement", implement_prompt)
+        model = step_models.get("implement", model)
+        with tracer.span("step:implement", race=race):
+            if race and race > 1:
+                extra = [AsyncOllamaClient(host=host, model=client.model) for host in config.race_hosts]
+                try:
+                    implementation = await async_race_generate(implement_prompt, [client] + extra, race,
+                                                               model, implement_options)
+                finally:
+                    for other in extra:
+                        await other.close()
+            else:
+                implementation = await client.generate(implement_prompt, model, options=implement_options)
+        _check_output("implementation", implementation)
+        logger.info("✅ Implementation: %.100s...", implementation)
+        if on_step:
+            on_step("implementation", implementation)
+
+        return {
+            "thinking": thinking,
+            "plan": plan,
+            "implementation": implementation
+        }
+    finally:
+        if owns_client:
+            await client.close()
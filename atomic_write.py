@@ -0,0 +1,42 @@
+"""
+Atomic file replacement shared by everything that persists state: data goes to a
+temp file in the target's directory and is renamed over the target, so readers see
+either the old file or the complete new one, never a partial write.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, BinaryIO, Union
+
+
+def write_atomic(path: Path, data: Union[bytes, Callable[[BinaryIO], None]], mode: int = None,
+                 fsync: bool = False):
+    """
+    Replace a file through a temp file and atomic rename.
+
+    Args:
+        path: File to write (parent directories are created)
+        data: Bytes to write, or a callable writing to the open binary temp file
+        mode: Permission bits for the new file (default: mkstemp's 0o600)
+        fsync: Flush to disk before the rename, so a crash cannot leave an empty file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
@@ -0,0 +1,107 @@
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Callable, TextIO
+from agent import Agent
+from ollama_client import OllamaClient
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def read_prompts(stream: TextIO) -> List[Dict[str, Any]]:
+    """
+    Read batch prompts, one per line.
+    
+    Lines may be JSON objects ({"id": ..., "prompt": ...}), JSON strings, or plain text.
+    
+    Returns:
+        List of {"id", "prompt"} dicts (ids default to the line number)
+    """
+    prompts = []
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            item = line
+        if isinstance(item, str):
+            item = {"prompt": item}
+        if not isinstance(item, dict) or not item.get("prompt"):
+            logger.warning("Skipping line %d: no prompt", number)
+            continue
+        item.setdefault("id", number)
+        prompts.append(item)
+    return prompts
+
+
+def run_batch(prompts: List[Dict[str, Any]], concurrency: int = 4, model: str = None,
+              use_workflow: bool = True, on_result: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    """
+    Execute prompts concurrently, each with its own isolated in-memory session.
+    
+    Generated code is returned in each record rather than written to disk: auto-execute
+    writes into the shared working directory, where concurrent tasks would overwrite
+    each other's files.
+    
+    Args:
+        prompts: Items from read_prompts
+        concurrency: Maximum tasks in flight
+        model: Model override for every task
+        use_workflow: Use think-prepare-implement workflow
+        on_result: Callback invoked with each result record as it finishes
+    
+    Returns:
+        Aggregate throughput summary
+    """
+    # One client for all tasks so they share a warm connection pool
+    client = OllamaClient(model=model)
+    
+    def run_one(item: Dict[str, Any]) -> Dict[str, Any]:
+        agent = Agent(client=client, session_state=config.create_blank_state(), persist=False,
+                      auto_execute=False)
+        start = time.perf_counter()
+        result = agent.execute(item["prompt"], use_workflow=item.get("workflow", use_workflow))
+        return {
+            "id": item["id"],
+            "prompt": item["prompt"],
+            "status": "error" if "error" in result else "ok",
+            "result": result,
+            "elapsed": round(time.perf_counter() - start, 3),
+        }
+    
+    started = time.perf_counter()
+    ok = failed = 0
+    task_time = 0.0
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(run_one, item): item for item in prompts}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                item = futures[future]
+                record = {"id": item["id"], "prompt": item["prompt"], "status": "error",
+                          "result": {"error": str(e)}, "elapsed": 0.0}
+            if record["status"] == "ok":
+                ok += 1
+            else:
+                failed += 1
+            task_time += record["elapsed"]
+            if on_result:
+                on_result(record)
+    
+    wall = time.perf_counter() - started
+    return {
+        "tasks": len(prompts),
+        "ok": ok,
+        "failed": failed,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "tasks_per_minute": round(len(prompts) / wall * 60, 2) if wall else 0.0,
+        # Sum of per-task time over wall time: how much concurrency actually overlapped work
+        "effective_parallelism": round(task_time / wall, 2) if wall else 0.0,
+    }
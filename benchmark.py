@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for CLIAgent.
+Runs the agent against a local fake Ollama server and measures the agent's own
+overhead (prompt building, parsing, file creation, state persistence) across
+session sizes. Results are written as JSON for regression tracking.
+
+Usage:
+    python benchmark.py                          # print JSON report to stdout
+    python benchmark.py --output bench.json      # write report to a file
+    python benchmark.py --compare bench.json     # compare against a previous report
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import platform
+import argparse
+import statistics
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+from fake_ollama import FakeOllamaServer, RESPONSE_SHAPES
+
+DEFAULT_SESSION_SIZES = [0, 10, 100, 1000]
+
+
+def make_session(size: int) -> Dict[str, Any]:
+    """Build a synthetic session state with `size` messages and created files."""
+    message = {
+        "prompt": "Create a simple calculator app with a tkinter UI " * 4,
+        "result": {
+            "thinking": RESPONSE_SHAPES["text"] * 4,
+            "plan": RESPONSE_SHAPES["text"] * 10,
+            "implementation": RESPONSE_SHAPES["files"] * 10,
+        },
+        "timestamp": datetime.now().isoformat(),
+    }
+    return {
+        "messages": [copy.deepcopy(message) for _ in range(size)],
+        "files_created": [f"project/module_{i}.py" for i in range(size)],
+        "files_modified": [],
+        "project_context": f"Working on project with {size} file(s)" if size else "",
+        "current_working_dir": str(Path.cwd()),
+        "session_start": datetime.now().isoformat(),
+    }
+
+
+def measure(name: str, func: Callable[[], Any], iterations: int,
+            setup: Callable[[], Any] = None, **params) -> Dict[str, Any]:
+    """Time `func` over several iterations, running `setup` untimed before each."""
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return {
+        "name": name,
+        "params": params,
+        "iterations": iterations,
+        "mean_ms": round(statistics.mean(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+        "stdev_ms": round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+    }
+
+
+def run_benchmarks(server: FakeOllamaServer, sizes: List[int], iterations: int) -> List[Dict[str, Any]]:
+    """Run every benchmark case against the fake server."""
+    # Imported here so STATE_DIR / OLLAMA_HOST overrides are picked up by the config singleton
+    from agent import Agent
+    from config import config
+    from ollama_client import OllamaClient, think_prepare_implement
+
+    results = []
+    client = OllamaClient(host=server.url)
+
+    results.append(measure(
+        "think_prepare_implement",
+        lambda: think_prepare_implement("Create a calculator", client=client),
+        iterations,
+    ))
+
+    agent = Agent()
+    agent.client = client
+    implementation = RESPONSE_SHAPES["files"]
+
+    results.append(measure(
+        "_auto_execute", lambda: agent._auto_execute(implementation), iterations,
+        setup=lambda: agent.session_state.update(make_session(0)),
+    ))
+
+    for size in sizes:
+        session = make_session(size)
+
+        def reset(session=session):
+            agent.session_state = copy.deepcopy(session)
+
+        results.append(measure(
+            "_build_context_prompt", lambda: agent._build_context_prompt("Add a history panel"),
+            max(iterations * 10, 10), setup=reset, session_size=size,
+        ))
+        results.append(measure(
+            "Config.save_session_state", lambda: config.save_session_state(agent.session_state),
+            iterations, setup=reset, session_size=size,
+        ))
+        results.append(measure(
+            "Agent.execute", lambda: agent.execute("Add a history panel"),
+            iterations, setup=reset, session_size=size,
+        ))
+        results.append(measure(
+            "Agent.execute(use_workflow=False)",
+            lambda: agent.execute("Add a history panel", use_workflow=False),
+            iterations, setup=reset, session_size=size,
+        ))
+
+    return results
+
+
+def git_revision() -> str:
+    """Return the current git commit, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent, timeout=5,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`."""
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    previous = {key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if not old or not old["median_ms"]:
+            continue
+        change = (result["median_ms"] - old["median_ms"]) / old["median_ms"]
+        if change > threshold:
+            regressions.append(
+                f"{result['name']} {result['params']}: "
+                f"{old['median_ms']:.3f}ms -> {result['median_ms']:.3f}ms (+{change:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLIAgent against a fake Ollama server")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SESSION_SIZES,
+                        help="Session sizes (message count) to benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake server latency per request (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Fake server token rate")
+    parser.add_argument("--shape", choices=sorted(RESPONSE_SHAPES), default="files")
+    parser.add_argument("--parallel", type=int, default=0, help="Fake server parallel slots (0 = unlimited)")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+    output = Path(args.output).resolve() if args.output else None
+    baseline = Path(args.compare).resolve() if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix="cliagent_bench_")
+    os.environ["STATE_DIR"] = os.path.join(workdir, ".agent_state")
+    os.environ["HOME"] = workdir  # _auto_execute creates directories under ~
+    os.chdir(workdir)
+
+    with FakeOllamaServer(latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                          shape=args.shape, parallel=args.parallel) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        results = run_benchmarks(server, args.sizes, args.iterations)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": {"latency": args.latency, "tokens_per_sec": args.tokens_per_sec,
+                       "shape": args.shape, "parallel": args.parallel},
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    else:
+        print(text)
+
+    if baseline:
+        regressions = compare(report, json.loads(baseline.read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from config import config
+from tracing import tracer
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Directories never indexed
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", "env",
+             ".mypy_cache", ".pytest_cache", ".tox", "dist", "build", ".idea", ".vscode"}
+
+# Files larger than this, or containing NUL bytes, are not indexed
+MAX_FILE_BYTES = 1_000_000
+
+# Characters of a matching line shown per result
+LINE_LIMIT = 200
+
+
+def trigrams(text: str) -> Set[str]:
+    """Lower-cased character trigrams within each line of a text (matches never span lines)."""
+    grams = set()
+    for line in set(text.lower().splitlines()):
+        grams.update(map(''.join, zip(line, line[1:], line[2:])))
+    return grams
+
+
+def required_literals(pattern: str, flags: int = 0) -> List[str]:
+    """
+    Literal substrings every match of a regex must contain.
+
+    Only consecutive literal characters at the top level of the pattern count;
+    anything else (classes, repeats, groups, alternation) ends a run. An empty
+    result means the index cannot narrow the search.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    literals, run = [], []
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(chr(arg))
+            continue
+        if len(run) >= 3:
+            literals.append("".join(run))
+        run = []
+    if len(run) >= 3:
+        literals.append("".join(run))
+    return literals
+
+
+class CodeIndex:
+    """
+    Persistent trigram index of a workspace for fast code search.
+
+    Each indexed file's lower-cased trigrams are stored in SQLite under the state
+    directory. Before every search, files whose mtime or size changed are re-indexed
+    and deleted files dropped, so only stat calls are paid for unchanged files. A query
+    is narrowed to files containing all trigrams of its literal parts, then those files
+    are scanned line by line.
+    """
+
+    def __init__(self, root: str = ".", index_path: Path = None):
+        """
+        Args:
+            root: Workspace directory to index
+            index_path: SQLite file (defaults to one per workspace under the state directory)
+        """
+        self.root = Path(root).resolve()
+        if index_path is None:
+            key = hashlib.sha1(str(self.root).encode()).hexdigest()[:12]
+            index_path = config.state_dir / f"code_index_{key}.sqlite"
+        self.index_path = Path(index_path)
+        self._skip_paths = {config.state_dir.resolve()}
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL, size INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS trigrams (
+                    tri TEXT, file INTEGER, PRIMARY KEY (tri, file)
+                ) WITHOUT ROWID;
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Open the index, commit on success and always close."""
+        db = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA cache_size=-65536")  # 64 MiB; keeps bulk (re)indexing off the disk
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def _walk(self) -> Dict[str, Tuple[float, int]]:
+        """Map relative path -> (mtime, size) for every indexable file."""
+        found = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS and Path(entry.path).resolve() not in self._skip_paths:
+                            stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        if stat.st_size <= MAX_FILE_BYTES:
+                            found[os.path.relpath(entry.path, self.root)] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    continue
+        return found
+
+    def _read(self, relative: str) -> Optional[str]:
+        try:
+            data = (self.root / relative).read_bytes()
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None  # Binary
+        return data.decode('utf-8', errors='replace')
+
+    def update(self) -> Dict[str, int]:
+        """
+        Bring the index up to date with the workspace.
+
+        Returns:
+            Counts of files 'indexed' (new or changed), 'removed' and 'total'
+        """
+        with tracer.span("search:update"), self._connect() as db:
+            current = self._walk()
+            known = {path: (file_id, mtime, size)
+                     for file_id, path, mtime, size in db.execute("SELECT id, path, mtime, size FROM files")}
+
+            removed = [known[path][0] for path in known if path not in current]
+            changed = [path for path, stat in current.items()
+                       if path not in known or known[path][1:] != stat]
+
+            for file_id in removed:
+                db.execute("DELETE FROM trigrams WHERE file = ?", (file_id,))
+                db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+            for path in changed:
+                mtime, size = current[path]
+                if path in known:
+                    file_id = known[path][0]
+                    db.execute("DELETE FROM trigrams WHERE file = ?", (file_id,))
+                    db.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?", (mtime, size, file_id))
+                else:
+                    file_id = db.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                         (path, mtime, size)).lastrowid
+                text = self._read(path)
+                if text:
+                    db.executemany("INSERT OR IGNORE INTO trigrams (tri, file) VALUES (?, ?)",
+                                   ((tri, file_id) for tri in trigrams(text)))
+
+            if removed or changed:
+                logger.debug("Code index: %d file(s) indexed, %d removed", len(changed), len(removed))
+            return {"indexed": len(changed), "removed": len(removed), "total": len(current)}
+
+    def _candidates(self, db: sqlite3.Connection, literals: List[str], prefix: str) -> List[str]:
+        """Files under `prefix` that contain every trigram of the literals (all files if none)."""
+        needed = set()
+        for literal in literals:
+            needed |= trigrams(literal)
+        if not needed:
+            rows = db.execute("SELECT path FROM files ORDER BY path")
+        else:
+            placeholders = ",".join("?" * len(needed))
+            rows = db.execute(f"""
+                SELECT f.path FROM trigrams t JOIN files f ON f.id = t.file
+                WHERE t.tri IN ({placeholders})
+                GROUP BY t.file HAVING COUNT(*) = ? ORDER BY f.path
+            """, (*needed, len(needed)))
+        if not prefix:
+            return [row[0] for row in rows]
+        # Match whole path components: "src" must not pick up "src2/..."
+        return [row[0] for row in rows if row[0] == prefix or row[0].startswith(prefix + os.sep)]
+
+    def search(self, query: str, regex: bool = False, path: str = None,
+               case_sensitive: bool = False, max_results: int = 50) -> Tuple[List[Tuple[str, int, str]], bool]:
+        """
+        Search the workspace.
+
+        Args:
+            query: Literal text, or a regular expression if `regex`
+            regex: Treat `query` as a Python regular expression
+            path: Only search this relative file, or files under this relative directory
+            case_sensitive: Match case exactly
+            max_results: Maximum matching lines returned
+
+        Returns:
+            (matches, truncated): up to max_results (path, line number, line) tuples, and
+            whether more matching lines exist (scanning stops at the cap)
+
+        Raises:
+            ValueError for an invalid regular expression
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            pattern = re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        literals = required_literals(query, flags) if regex else [query]
+        prefix = os.path.normpath(path) if path and path not in (".", "./") else ""
+
+        self.update()
+        matches = []
+        with tracer.span("search:query", regex=regex), self._connect() as db:
+            candidates = self._candidates(db, literals, prefix)
+        for relative in candidates:
+            text = self._read(relative)
+            if not text:
+                continue
+            for number, line in enumerate(text.splitlines(), 1):
+                if pattern.search(line):
+                    if len(matches) == max_results:
+                        return matches, True
+                    matches.append((relative, number, line.strip()[:LINE_LIMIT]))
+        return matches, False
+
+
+def format_matches(matches: List[Tuple[str, int, str]], truncated: bool) -> str:
+    """Render search results as path:line: text lines."""
+    if not matches:
+        return "No matches found"
+    lines = [f"{path}:{number}: {text}" for path, number, text in matches]
+    if truncated:
+        lines.append(f"... more matches after {len(matches)}; narrow the query or path")
+    return "\n".join(lines)
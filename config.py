@@ -1,17 +1,32 @@
 import os
+import re
 import json
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Optional, Dict, Any
 from datetime import datetime
 from pathlib import Path
+from tracing import traced
+from log_config import setup_logging
+from atomic_write import write_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Default Ollama generation options per workflow step. num_predict caps output
+# length so short steps finish fast; "default" applies to single-shot prompts.
+DEFAULT_STEP_OPTIONS = {
+    "think": {"num_predict": 256, "temperature": 0.3},
+    "prepare": {"num_predict": 1024, "temperature": 0.4},
+    "implement": {"num_predict": 4096, "temperature": 0.2},
+    "default": {"num_predict": 4096},
+}
+
 
 class Config:
     """Configuration manager for the CLI agent."""
@@ -19,22 +34,155 @@ class Config:
     def __init__(self):
         self.ollama_host = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
         self.default_model = os.getenv('DEFAULT_MODEL', 'mistral')
+        # How long Ollama keeps a model loaded after a request (e.g. "30m", "1h", "-1" = forever)
+        self.keep_alive = os.getenv('KEEP_ALIVE', '30m')
+        # Per-model overrides, e.g. MODEL_KEEP_ALIVE="mistral=1h,codellama=10m"
+        self.model_keep_alive = self._parse_mapping(os.getenv('MODEL_KEEP_ALIVE', ''))
+        # Unload the previous model from Ollama when switching models
+        self.unload_on_switch = os.getenv('UNLOAD_ON_SWITCH', 'true').lower() == 'true'
+        # Per-step generation options, overridable with a JSON object, e.g.
+        # GENERATION_OPTIONS='{"think": {"num_predict": 128, "stop": ["\\n\\n"]}}'
+        self.step_options = self._load_step_options(os.getenv('GENERATION_OPTIONS', ''))
+        # num_ctx is sized from the prompt and rounded up to a power of two within these bounds;
+        # set NUM_CTX to pin a fixed context size instead
+        self.num_ctx = int(os.getenv('NUM_CTX', '0'))
+        self.min_num_ctx = int(os.getenv('MIN_NUM_CTX', '2048'))
+        self.max_num_ctx = int(os.getenv('MAX_NUM_CTX', '16384'))
+        # Tool-calling loop: worker threads for concurrent tool calls, and max model turns
+        self.tool_workers = int(os.getenv('TOOL_WORKERS', '8'))
+        self.max_tool_turns = int(os.getenv('MAX_TOOL_TURNS', '8'))
+        # Race mode: implement-step candidates to generate concurrently (0/1 = off),
+        # optionally spread across extra Ollama hosts (comma-separated)
+        self.race_candidates = int(os.getenv('RACE_CANDIDATES', '0'))
+        # Adaptive (AIMD) limit on in-flight Ollama requests, shared per host
+        self.adaptive_concurrency = os.getenv('ADAPTIVE_CONCURRENCY', 'true').lower() == 'true'
+        self.initial_concurrency = int(os.getenv('INITIAL_CONCURRENCY', '2'))
+        self.max_concurrency = int(os.getenv('MAX_CONCURRENCY', '16'))
+        # Queueing delay (seconds) above which the limit is reduced
+        self.target_queue_delay = float(os.getenv('TARGET_QUEUE_DELAY', '0.5'))
+        # Prefetch URLs/files mentioned in the prompt while the think step runs
+        self.prefetch = os.getenv('PREFETCH', 'true').lower() == 'true'
+        self.prefetch_timeout = float(os.getenv('PREFETCH_TIMEOUT', '15'))
+        # Background jobs in interactive mode: max generations in flight
+        self.job_workers = int(os.getenv('JOB_WORKERS', '2'))
+        # Model selection from the `models --bench` profile: tiers map to a minimum
+        # parameter count in billions; AUTO_MODEL picks the fastest model in MODEL_TIER,
+        # STEP_MODEL_TIERS routes workflow steps, e.g. "think=small,implement=large"
+        self.model_tiers = {tier: float(size) for tier, size in self._parse_mapping(
+            os.getenv('MODEL_TIERS', 'small=0,medium=7,large=13')).items()}
+        self.auto_model = os.getenv('AUTO_MODEL', 'false').lower() == 'true'
+        self.model_tier = os.getenv('MODEL_TIER', 'small')
+        self.step_model_tiers = self._parse_mapping(os.getenv('STEP_MODEL_TIERS', ''))
+        # Semantic prompt cache: "off", "offer" (ask before reusing) or "return" (reuse silently)
+        # a previous result whose prompt embedding is at least SEMANTIC_CACHE_THRESHOLD similar
+        self.semantic_cache = os.getenv('SEMANTIC_CACHE', 'off').lower()
+        self.embed_model = os.getenv('EMBED_MODEL', 'nomic-embed-text')
+        self.semantic_cache_threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+        self.semantic_cache_size = int(os.getenv('SEMANTIC_CACHE_SIZE', '500'))
+        self.semantic_cache_scopes = int(os.getenv('SEMANTIC_CACHE_SCOPES', '32'))
+        # Logging: root level, per-module levels (LOG_LEVELS="ollama_client=DEBUG,transport=WARNING"),
+        # console output (text | json | off) and an optional JSON-lines log file
+        self.log_level = os.getenv('LOG_LEVEL', 'INFO')
+        self.log_levels = self._parse_mapping(os.getenv('LOG_LEVELS', ''))
+        self.log_console = os.getenv('LOG_CONSOLE', 'text')
+        self.log_file = os.getenv('LOG_FILE', '')
+        # Record/replay HTTP traffic to a cassette file (AGENT_CASSETTE_MODE: record | replay);
+        # REPLAY_TIMING "none" replays instantly, "recorded" reproduces the recorded latency
+        self.cassette = os.getenv('AGENT_CASSETTE', '')
+        self.cassette_mode = os.getenv('AGENT_CASSETTE_MODE', 'replay')
+        self.replay_timing = os.getenv('REPLAY_TIMING', 'none')
+        self.race_hosts = [h.strip() for h in os.getenv('RACE_HOSTS', '').split(',') if h.strip()]
         self.state_dir = Path(os.getenv('STATE_DIR', './.agent_state'))
         self.state_dir.mkdir(exist_ok=True)
         self.current_session_file = self.state_dir / "current_session.json"
-        self.session_archive_file = self.state_dir / f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        # Named sessions (one file each) used by AgentPool and --session
+        self.sessions_dir = self.state_dir / "sessions"
+        # Session used when none is named explicitly (None = current_session.json)
+        self.session_name = os.getenv('AGENT_SESSION') or None
+        # Serializes access per session file within this process (fcntl covers other processes)
+        self._file_locks: Dict[Path, threading.Lock] = {}
+        self._file_locks_guard = threading.Lock()
+        # Archived sessions: compressed, content-addressed blobs plus one manifest per archive
+        self.archive_dir = self.state_dir / "archive"
+        # Undo history of agent file writes: snapshots of overwritten/deleted files, one
+        # changeset per task; HISTORY_LIMIT changesets are kept
+        self.history_dir = self.state_dir / "history"
+        self.history_limit = int(os.getenv('HISTORY_LIMIT', '50'))
+    
+    @staticmethod
+    def _parse_mapping(value: str) -> Dict[str, str]:
+        """Parse "key=value,key2=value2" into a dict."""
+        mapping = {}
+        for item in value.split(','):
+            if '=' in item:
+                key, val = item.split('=', 1)
+                mapping[key.strip()] = val.strip()
+        return mapping
     
-    def get_session_state(self) -> Dict[str, Any]:
-        """Load current session state, or create new one."""
-        if self.current_session_file.exists():
+    @staticmethod
+    def _load_step_options(value: str) -> Dict[str, Dict[str, Any]]:
+        """Merge GENERATION_OPTIONS overrides into the default step options."""
+        options = {step: dict(opts) for step, opts in DEFAULT_STEP_OPTIONS.items()}
+        if value:
             try:
-                with open(self.current_session_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.warning("Current session file corrupted, starting fresh")
-        return self._create_blank_state()
+                for step, opts in json.loads(value).items():
+                    options.setdefault(step, {}).update(opts)
+            except (json.JSONDecodeError, AttributeError):
+                logger.warning("GENERATION_OPTIONS is not a valid JSON object, using defaults")
+        return options
+    
+    def keep_alive_for(self, model: str) -> str:
+        """Return the keep_alive duration to send for a model."""
+        return self.model_keep_alive.get(model, self.keep_alive)
+    
+    def session_file(self, name: str = None) -> Path:
+        """
+        Path of a session's state file.
+        
+        Args:
+            name: Session name, or None for the default session (AGENT_SESSION / --session)
+        """
+        name = name or self.session_name
+        if name is None:
+            return self.current_session_file
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+', name) or name.startswith('.'):
+            raise ValueError(f"Invalid session name: {name!r}")
+        self.sessions_dir.mkdir(exist_ok=True)
+        return self.sessions_dir / f"{name}.json"
     
-    def _create_blank_state(self) -> Dict[str, Any]:
+    @contextmanager
+    def _locked(self, path: Path, exclusive: bool = True):
+        """
+        Hold the lock for a session file: a thread lock within this process plus an
+        advisory fcntl lock on a sidecar .lock file (so atomic replaces don't drop it)
+        across processes sharing the state directory.
+        """
+        with self._file_locks_guard:
+            thread_lock = self._file_locks.setdefault(path, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(path.with_name(path.name + ".lock"), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def get_session_state(self, name: str = None) -> Dict[str, Any]:
+        """Load a session's state (the default session if no name is given), or create new one."""
+        path = self.session_file(name)
+        with self._locked(path, exclusive=False):
+            if path.exists():
+                try:
+                    with open(path, 'r') as f:
+                        return json.load(f)
+                except json.JSONDecodeError:
+                    logger.warning("Session file %s corrupted, starting fresh", path.name)
+        return self.create_blank_state()
+    
+    def create_blank_state(self) -> Dict[str, Any]:
         """Create blank session state."""
         return {
             "messages": [],
@@ -45,30 +193,58 @@ class Config:
             "session_start": datetime.now().isoformat()
         }
     
-    def save_session_state(self, state: Dict[str, Any]):
-        """Save session state to current session file (in-memory persistence)."""
-        with open(self.current_session_file, 'w') as f:
-            json.dump(state, f, indent=2)
+    @traced("state:save")
+    def save_session_state(self, state: Dict[str, Any], name: str = None):
+        """Save session state to its session file (the default session if no name is given)."""
+        path = self.session_file(name)
+        with self._locked(path):
+            write_atomic(path, json.dumps(state, indent=2).encode(), fsync=True)
+    
+    @property
+    def archive_store(self):
+        """Store holding archived sessions."""
+        from archive_store import ArchiveStore
+        return ArchiveStore(self.archive_dir)
     
-    def archive_session(self) -> str:
-        """Archive current session to timestamped file."""
-        if self.current_session_file.exists():
-            with open(self.current_session_file, 'r') as f:
+    def archive_session(self, name: str = None) -> str:
+        """Archive a session (the default session if no name is given) into the archive store."""
+        path = self.session_file(name)
+        with self._locked(path, exclusive=False):
+            if not path.exists():
+                return None
+            with open(path, 'r') as f:
                 state = json.load(f)
-            
-            with open(self.session_archive_file, 'w') as f:
-                json.dump(state, f, indent=2)
-            
-            logger.info(f"📦 Session archived to {self.session_archive_file.name}")
-            return str(self.session_archive_file)
-        return None
+        
+        manifest = self.archive_store.archive(state, name or self.session_name)
+        logger.info("📦 Session archived as %s", manifest.stem)
+        return str(manifest)
+    
+    def compact_archives(self) -> int:
+        """
+        Move legacy session_*.json archives into the archive store.
+        
+        Returns:
+            Number of archives converted
+        """
+        store = self.archive_store
+        converted = 0
+        for path in sorted(self.state_dir.glob("session_*.json")):
+            try:
+                store.import_json(path)
+                converted += 1
+            except (OSError, ValueError) as e:
+                logger.warning("Could not convert %s: %s", path.name, e)
+        return converted
     
-    def reset_session(self):
-        """Clear current session (start fresh)."""
-        if self.current_session_file.exists():
-            self.archive_session()
-            self.current_session_file.unlink()
+    def reset_session(self, name: str = None):
+        """Clear a session (the default session if no name is given) and start fresh."""
+        path = self.session_file(name)
+        if path.exists():
+            self.archive_session(name)
+            with self._locked(path):
+                path.unlink(missing_ok=True)
             logger.info("🔄 Session reset - starting fresh")
 
 
 config = Config()
+setup_logging(config.log_level, config.log_levels, config.log_console, config.log_file or None)
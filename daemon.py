@@ -0,0 +1,199 @@
+"""
+Resident agent daemon.
+Keeps agents (warm HTTP pool, per-session state) in memory and serves
+task/status/models requests over a local Unix socket. The client side only
+needs the standard library so thin CLI invocations start fast.
+
+Protocol: the client sends one JSON request line; the daemon answers with
+JSON lines ({"type": "log" | "step" | "result" | "error", ...}) and closes.
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def socket_path() -> Path:
+    """Location of the daemon socket (override with AGENT_SOCKET)."""
+    return Path(os.getenv('AGENT_SOCKET', config.state_dir / "agent.sock"))
+
+
+class DaemonClient:
+    """Thin client for a running agent daemon."""
+
+    def __init__(self, path: Path = None, timeout: float = None):
+        self.path = Path(path or socket_path())
+        self.timeout = timeout
+
+    def is_running(self) -> bool:
+        """Check whether a daemon is listening on the socket."""
+        if not self.path.exists():
+            return False
+        try:
+            return any(msg.get("type") == "result" for msg in self.request("ping"))
+        except OSError:
+            return False
+
+    def request(self, command: str, **params) -> Iterator[Dict[str, Any]]:
+        """
+        Send a command and yield streamed response messages.
+
+        Args:
+            command: One of ping, task, status, models, shutdown
+            **params: Command parameters
+
+        Yields:
+            Response messages as they arrive
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(str(self.path))
+            sock.sendall((json.dumps({"command": command, **params}) + "\n").encode())
+            with sock.makefile('r', encoding='utf-8') as stream:
+                for line in stream:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def connect() -> Optional[DaemonClient]:
+    """Return a client if a daemon is running, otherwise None."""
+    client = DaemonClient(timeout=1.0)
+    if client.is_running():
+        client.timeout = None  # Generations may take minutes
+        return client
+    return None
+
+
+class _StreamLogHandler(logging.Handler):
+    """Forward log records emitted by one request thread to its client."""
+
+    def __init__(self, send):
+        super().__init__(level=logging.INFO)
+        self.send = send
+        self.thread_id = threading.get_ident()
+
+    def emit(self, record: logging.LogRecord):
+        if record.thread != self.thread_id:
+            return
+        try:
+            self.send({"type": "log", "level": record.levelname, "message": record.getMessage()})
+        except OSError:
+            pass  # Client went away; keep working
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handle one JSON request line from a client."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            self._send({"type": "error", "error": "Invalid request"})
+            return
+
+        try:
+            self.server.daemon.dispatch(request, self._send)
+        except Exception as e:
+            logger.error("Daemon request failed: %s", e)
+            self._send({"type": "error", "error": str(e)})
+
+    def _send(self, message: Dict[str, Any]):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class AgentDaemon:
+    """Serve a resident Agent over a Unix socket."""
+
+    def __init__(self, model: str = None, path: Path = None):
+        from agent_pool import AgentPool
+
+        self.path = Path(path or socket_path())
+        # Requests may name a session; each gets isolated state, tasks in one session run in order
+        self.pool = AgentPool(model=model)
+        self.agent = self.pool.agent()
+        self._server: Optional[_UnixServer] = None
+
+    def serve_forever(self):
+        """Bind the socket and serve until shutdown."""
+        if DaemonClient(self.path, timeout=1.0).is_running():
+            raise RuntimeError(f"Daemon already running on {self.path}")
+        if self.path.exists():
+            self.path.unlink()  # Stale socket from a previous run
+
+        self._server = _UnixServer(str(self.path), _RequestHandler)
+        self._server.daemon = self
+        os.chmod(self.path, 0o600)
+        logger.info("🛰️  Agent daemon listening on %s", self.path)
+        self.agent.client.preload_async()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if self.path.exists():
+                self.path.unlink()
+
+    def shutdown(self):
+        """Stop serving (safe to call from a request thread)."""
+        if self._server:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def dispatch(self, request: Dict[str, Any], send):
+        """Run one request, streaming messages through `send`."""
+        command = request.get("command")
+
+        if command == "ping":
+            send({"type": "result", "result": {"pid": os.getpid()}})
+        elif command == "status":
+            send({"type": "result", "result": self.agent.show_status()})
+        elif command == "models":
+            send({"type": "result", "result": self.agent.get_available_models()})
+        elif command == "task":
+            self._run_task(request, send)
+        elif command == "shutdown":
+            send({"type": "result", "result": "shutting down"})
+            self.shutdown()
+        else:
+            send({"type": "error", "error": f"Unknown command: {command}"})
+
+    def _run_task(self, request: Dict[str, Any], send):
+        handler = _StreamLogHandler(send)
+        root = logging.getLogger()
+
+        session = request.get("session")
+        with self.pool.session_lock(session):
+            agent = self.pool.agent(session)
+            previous_model = agent.client.model
+            if request.get("model"):
+                # Per-request override; keep the daemon's own model loaded
+                agent.client.model = request["model"]
+            root.addHandler(handler)
+            try:
+                result = agent.execute(
+                    request["prompt"],
+                    use_workflow=request.get("workflow", True),
+                    use_tools=request.get("tools", False),
+                    race=request.get("race"),
+                    on_step=lambda name, text: send({"type": "step", "name": name, "text": text}),
+                )
+            finally:
+                root.removeHandler(handler)
+                agent.client.model = previous_model
+
+        send({"type": "result", "result": result})
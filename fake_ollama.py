@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Ollama HTTP API.
+Emulates /api/generate, /api/chat, /api/embed and /api/tags so the agent can be exercised
+and benchmarked without a live model.
+"""
+
+import json
+import math
+import time
+import zlib
+import threading
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+
+# Canned response bodies, selected with the `shape` option
+RESPONSE_SHAPES = {
+    "text": (
+        "The request asks for a small utility. It needs a single module with "
+        "a clear entry point and basic error handling."
+    ),
+    "code": (
+        "Here is the implementation in main.py:\n\n"
+        "```python\n"
+        "def add(a, b):\n"
+        "    return a + b\n"
+        "\n"
+        "\n"
+        "if __name__ == '__main__':\n"
+        "    print(add(2, 3))\n"
+        "```\n"
+    ),
+    "files": (
+        "Create the project with `mkdir bench_project` and add app.py and utils.py:\n\n"
+        "```python\n"
+        "from utils import greet\n"
+        "\n"
+        "print(greet('world'))\n"
+        "```\n\n"
+        "```python\n"
+        "def greet(name):\n"
+        "    return f'Hello, {name}!'\n"
+        "```\n"
+    ),
+}
+
+
+class FakeOllamaServer:
+    """Threaded HTTP server emulating the subset of the Ollama API the agent uses."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 tokens_per_sec: float = 0.0, shape: str = "code",
+                 response: str = None, models: List[str] = None,
+                 tool_calls: List[Dict[str, Any]] = None, parallel: int = 0):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Seconds to wait before the first token (simulates load + prompt eval)
+            tokens_per_sec: Generation rate; 0 returns the whole response instantly
+            shape: Key into RESPONSE_SHAPES used when `response` is not given
+            response: Explicit response text overriding `shape`
+            models: Model names reported by /api/tags
+            tool_calls: Tool calls returned by /api/chat until the conversation contains tool results
+            parallel: Requests processed at once, the rest queue (like OLLAMA_NUM_PARALLEL; 0 = unlimited)
+        """
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.response = response if response is not None else RESPONSE_SHAPES[shape]
+        self.models = models or ["mistral"]
+        self.tool_calls = tool_calls or []
+        self.requests: List[Dict[str, Any]] = []
+        self.loaded: List[str] = []
+        self.cancelled = 0  # Streams the client closed before completion
+        self.slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as OLLAMA_HOST."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        """Serve in the foreground (standalone mode)."""
+        self._httpd.serve_forever()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, path: str, body: Dict[str, Any]):
+        """Remember a request for later inspection."""
+        with self._lock:
+            self.requests.append({"path": path, "body": body})
+
+    def track_load(self, body: Dict[str, Any]):
+        """Mirror Ollama's loaded-model bookkeeping (keep_alive=0 unloads)."""
+        model = body.get("model", self.models[0])
+        with self._lock:
+            if model in self.loaded:
+                self.loaded.remove(model)
+            if body.get("keep_alive") not in (0, "0"):
+                self.loaded.append(model)
+
+    def tokens(self) -> List[str]:
+        """Split the response into whitespace-preserving pseudo tokens."""
+        parts = self.response.split(" ")
+        return [p if i == len(parts) - 1 else p + " " for i, p in enumerate(parts)]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _embed(text: str, dimensions: int = 64) -> List[float]:
+    """Deterministic bag-of-character-trigrams embedding (similar texts get similar vectors)."""
+    vector = [0.0] * dimensions
+    text = f"  {text.lower()} "
+    for i in range(len(text) - 2):
+        vector[zlib.crc32(text[i:i + 3].encode()) % dimensions] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _make_handler(server: FakeOllamaServer):
+    """Build a request handler class bound to `server`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output clean
+
+        def handle(self):
+            try:
+                super().handle()
+            except (ConnectionResetError, BrokenPipeError):
+                pass  # Client dropped a pooled connection
+
+        def _read_body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length", 0))
+            if not length:
+                return {}
+            try:
+                return json.loads(self.rfile.read(length))
+            except json.JSONDecodeError:
+                return {}
+
+        def _send_json(self, payload: Dict[str, Any], status: int = 200):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, chunks):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in chunks:
+                    data = (json.dumps(chunk) + "\n").encode()
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # Client closed the stream: stop generating, like Ollama does
+                with server._lock:
+                    server.cancelled += 1
+                self.close_connection = True
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                server.record(self.path, {})
+                self._send_json({"models": [
+                    {"name": name, "model": name, "modified_at": _now(), "size": 4_000_000_000,
+                     "details": {"parameter_size": "7B", "quantization_level": "Q4_0"}}
+                    for name in server.models
+                ]})
+            elif self.path == "/api/ps":
+                server.record(self.path, {})
+                self._send_json({"models": [{"name": name, "model": name} for name in server.loaded]})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            body = self._read_body()
+            server.record(self.path, body)
+
+            if self.path in ("/api/generate", "/api/chat"):
+                server.track_load(body)
+            if self.path == "/api/generate" and "prompt" not in body:
+                # Load/unload request: no generation
+                self._send_json({"model": body.get("model"), "created_at": _now(), "response": "", "done": True})
+            elif self.path == "/api/embed":
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send_json({"model": body.get("model"), "embeddings": [_embed(text) for text in inputs]})
+            elif self.path == "/api/generate":
+                self._respond(body, lambda text: {"response": text})
+            elif self.path == "/api/chat" and server.tool_calls and body.get("tools") and \
+                    not any(m.get("role") == "tool" for m in body.get("messages", [])):
+                self._send_json({"model": body.get("model"), "created_at": _now(), "done": True,
+                                 "message": {"role": "assistant", "content": "",
+                                             "tool_calls": server.tool_calls}})
+            elif self.path == "/api/chat":
+                self._respond(body, lambda text: {"message": {"role": "assistant", "content": text}})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def _respond(self, body: Dict[str, Any], wrap):
+            if server.slots:
+                with server.slots:
+                    return self._generate(body, wrap)
+            return self._generate(body, wrap)
+
+        def _generate(self, body: Dict[str, Any], wrap):
+            model = body.get("model", server.models[0])
+            start = time.perf_counter()
+            if server.latency:
+                time.sleep(server.latency)
+            tokens = server.tokens()
+            delay = 1.0 / server.tokens_per_sec if server.tokens_per_sec else 0.0
+
+            def stats() -> Dict[str, Any]:
+                total = int((time.perf_counter() - start) * 1e9)
+                return {
+                    "total_duration": total,
+                    "load_duration": 0,
+                    "prompt_eval_count": len(str(body.get("prompt", body.get("messages", "")))) // 4,
+                    "prompt_eval_duration": int(server.latency * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": max(total - int(server.latency * 1e9), 0),
+                }
+
+            if body.get("stream", True):
+                def chunks():
+                    for token in tokens:
+                        if delay:
+                            time.sleep(delay)
+                        yield {"model": model, "created_at": _now(), **wrap(token), "done": False}
+                    yield {"model": model, "created_at": _now(), **wrap(""), "done": True, **stats()}
+                self._send_stream(chunks())
+            else:
+                if delay:
+                    time.sleep(delay * len(tokens))
+                self._send_json({"model": model, "created_at": _now(),
+                                 **wrap(server.response), "done": True, **stats()})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Generation rate (0 = instant)")
+    parser.add_argument("--shape", choices=sorted(RESPONSE_SHAPES), default="code")
+    parser.add_argument("--parallel", type=int, default=0, help="Requests processed at once (0 = unlimited)")
+    parser.add_argument("--model", action="append", dest="models", help="Model name to advertise")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.latency, args.tokens_per_sec,
+                              args.shape, models=args.models, parallel=args.parallel)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
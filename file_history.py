@@ -0,0 +1,225 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from config import config
+from log_config import correlation_id
+from atomic_write import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Changeset open in the current execute call (copied into tool/prefetch worker contexts)
+_active: contextvars.ContextVar = contextvars.ContextVar("changeset", default=None)
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """SHA-256 of a file's content, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class Changeset:
+    """Files touched by one execute call, with the digest of their content beforehand."""
+
+    def __init__(self, history: "FileHistory", description: str):
+        self.history = history
+        self.id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:4]}"
+        self.description = description
+        self.started = datetime.now().isoformat()
+        self.correlation_id = correlation_id()
+        # Absolute path -> {"before": digest or None (file did not exist), "mode": permission bits,
+        # "after": digest once the changeset is finished}
+        self.changes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "description": self.description, "started": self.started,
+                "correlation_id": self.correlation_id, "changes": self.changes}
+
+
+class FileHistory:
+    """
+    Copy-on-write undo history for agent file writes.
+
+    Before a file is overwritten or deleted, its current content is kept in a
+    content-addressed blob store: the file is hard-linked into the store (no data is
+    copied) and the write then replaces the path with a new file, leaving the old
+    inode to the blob. Identical content is stored once. Each execute call collects
+    its snapshots in a changeset, which `undo` restores from the blobs.
+    """
+
+    def __init__(self, root: Path = None, limit: int = None):
+        """
+        Args:
+            root: History directory (holds blobs/ and changesets/; defaults to state_dir/history)
+            limit: Changesets kept; older ones and blobs only they reference are dropped
+        """
+        self.root = Path(root or config.history_dir)
+        self.limit = limit or config.history_limit
+        self.blobs_dir = self.root / "blobs"
+        self.changesets_dir = self.root / "changesets"
+
+    @contextmanager
+    def changeset(self, description: str):
+        """
+        Record the files written inside this block as one changeset.
+
+        Nested blocks join the outer changeset. Nothing is stored unless a file changes.
+        """
+        if _active.get() is not None:
+            yield _active.get()
+            return
+        current = Changeset(self, description)
+        token = _active.set(current)
+        try:
+            yield current
+        finally:
+            _active.reset(token)
+            if current.changes:
+                self._finish(current)
+                self.prune()
+
+    def snapshot(self, changeset: Changeset, path: Path):
+        """Keep a file's current content before its first change in a changeset."""
+        key = str(Path(path).resolve())
+        with changeset._lock:
+            if key in changeset.changes:
+                return
+            digest, mode = None, None
+            if os.path.lexists(key):
+                mode = os.stat(key).st_mode & 0o7777
+                digest = self._store(Path(key))
+            changeset.changes[key] = {"before": digest, "mode": mode}
+            self._save(changeset)
+
+    def _finish(self, changeset: Changeset):
+        """Record what each file looks like after the changeset, to detect later edits on undo."""
+        with changeset._lock:
+            for path, change in changeset.changes.items():
+                change["after"] = file_digest(Path(path))
+            self._save(changeset)
+
+    def _save(self, changeset: Changeset):
+        write_atomic(self.changesets_dir / f"{changeset.id}.json", json.dumps(changeset.to_dict()).encode())
+
+    def _store(self, path: Path) -> str:
+        """Add a file's content to the blob store (hard link, copy across filesystems)."""
+        digest = file_digest(path)
+        blob = self.blobs_dir / digest
+        if not blob.exists():
+            self.blobs_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                pass  # Stored concurrently
+            except OSError:
+                write_atomic(blob, path.read_bytes())
+        return digest
+
+    def list(self) -> List[Dict[str, Any]]:
+        """All changesets, newest first."""
+        changesets = []
+        for path in self.changesets_dir.glob("*.json"):
+            try:
+                with open(path, 'r') as f:
+                    changesets.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable changeset %s: %s", path.name, e)
+        changesets.sort(key=lambda c: c["id"], reverse=True)
+        return changesets
+
+    def get(self, changeset_id: str) -> Optional[Dict[str, Any]]:
+        path = self.changesets_dir / f"{changeset_id}.json"
+        if not path.exists():
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def undo(self, changeset_id: str = None, force: bool = False) -> Dict[str, Any]:
+        """
+        Restore the files of a changeset to their content before it.
+
+        Args:
+            changeset_id: Changeset to undo (defaults to the newest one not yet undone)
+            force: Also restore files edited again after the changeset
+
+        Returns:
+            Dict with the changeset 'id', 'description', 'restored' and 'removed' paths and
+            'conflicts' (paths edited since, left alone unless forced), or 'error'
+        """
+        if changeset_id:
+            changeset = self.get(changeset_id)
+            if changeset is None:
+                return {"error": f"No changeset {changeset_id}"}
+        else:
+            changeset = next((c for c in self.list() if not c.get("undone")), None)
+            if changeset is None:
+                return {"error": "Nothing to undo"}
+        if changeset.get("undone"):
+            return {"error": f"Changeset {changeset['id']} was already undone"}
+
+        result = {"id": changeset["id"], "description": changeset["description"],
+                  "restored": [], "removed": [], "conflicts": []}
+        for path, change in changeset["changes"].items():
+            # Edited since (by the user or a later task): restoring would drop that work
+            if "after" in change and file_digest(Path(path)) != change["after"] and not force:
+                result["conflicts"].append(path)
+                continue
+            if change["before"] is None:
+                if os.path.lexists(path):
+                    os.unlink(path)
+                    result["removed"].append(path)
+            else:
+                self._restore(Path(path), change["before"], change.get("mode"))
+                result["restored"].append(path)
+
+        if not result["conflicts"]:
+            changeset["undone"] = datetime.now().isoformat()
+            write_atomic(self.changesets_dir / f"{changeset['id']}.json", json.dumps(changeset).encode())
+        logger.info("↩️  Undid %s: %d restored, %d removed, %d conflict(s)", changeset["id"],
+                    len(result["restored"]), len(result["removed"]), len(result["conflicts"]))
+        return result
+
+    def _restore(self, path: Path, digest: str, mode: Optional[int]):
+        """Copy a blob back into place (a copy, so later edits never touch the blob)."""
+        with open(self.blobs_dir / digest, 'rb') as src:
+            write_atomic(path, lambda dst: shutil.copyfileobj(src, dst), mode=mode)
+
+    def prune(self):
+        """Drop changesets beyond the limit and blobs no remaining changeset references."""
+        changesets = self.list()
+        for old in changesets[self.limit:]:
+            (self.changesets_dir / f"{old['id']}.json").unlink(missing_ok=True)
+        referenced = {change["before"] for c in changesets[:self.limit] for change in c["changes"].values()}
+        if self.blobs_dir.exists():
+            # Blobs linked in the last minute may belong to a changeset another process is writing
+            recent = time.time() - 60
+            for blob in self.blobs_dir.iterdir():
+                if blob.name not in referenced and not blob.name.startswith(".") and blob.stat().st_ctime < recent:
+                    blob.unlink(missing_ok=True)
+
+    def size(self) -> int:
+        """Bytes used on disk by blobs (hard-linked blobs count in full)."""
+        return sum(p.stat().st_size for p in self.blobs_dir.iterdir()) if self.blobs_dir.exists() else 0
+
+
+def snapshot(path: Path):
+    """Snapshot a file about to be written, if a changeset is being recorded."""
+    current = _active.get()
+    if current is not None:
+        current.history.snapshot(current, path)
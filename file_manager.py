@@ -2,14 +2,33 @@ import os
 import logging
 from pathlib import Path
 from typing import Optional, List
+from tracing import traced
+from file_history import snapshot
+from atomic_write import write_atomic
 
 logger = logging.getLogger(__name__)
 
 
+def _write(path: Path, content: str):
+    """
+    Write a file, snapshotting its previous content for undo.
+
+    Existing files are replaced through a temp file rather than rewritten in place, so
+    a snapshot hard-linked to the old content stays intact (and readers never see a
+    half-written file).
+    """
+    snapshot(path)
+    if path.exists():
+        write_atomic(path, content.encode('utf-8'), mode=path.stat().st_mode & 0o7777)
+    else:
+        path.write_text(content, encoding='utf-8')
+
+
 class FileManager:
     """Manage file operations for the agent."""
     
     @staticmethod
+    @traced("file:write")
     def create_file(filepath: str, content: str, overwrite: bool = False) -> bool:
         """
         Create a file with given content.
@@ -26,18 +45,19 @@ class FileManager:
             path = Path(filepath)
             
             if path.exists() and not overwrite:
-                logger.warning(f"File already exists: {filepath}")
+                logger.warning("File already exists: %s", filepath)
                 return False
             
             path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text(content)
-            logger.info(f"✅ File created: {filepath}")
+            _write(path, content)
+            logger.info("✅ File created: %s", filepath)
             return True
         except Exception as e:
-            logger.error(f"Failed to create file: {e}")
+            logger.error("Failed to create file: %s", e)
             return False
     
     @staticmethod
+    @traced("file:edit")
     def edit_file(filepath: str, content: str, append: bool = False) -> bool:
         """
         Edit or append to a file.
@@ -54,20 +74,19 @@ class FileManager:
             path = Path(filepath)
             
             if not path.exists():
-                logger.error(f"File does not exist: {filepath}")
+                logger.error("File does not exist: %s", filepath)
                 return False
             
             if append:
-                with open(path, 'a') as f:
-                    f.write('\n' + content)
-                logger.info(f"📝 Content appended to: {filepath}")
+                _write(path, path.read_text() + '\n' + content)
+                logger.info("📝 Content appended to: %s", filepath)
             else:
-                path.write_text(content)
-                logger.info(f"📝 File updated: {filepath}")
+                _write(path, content)
+                logger.info("📝 File updated: %s", filepath)
             
             return True
         except Exception as e:
-            logger.error(f"Failed to edit file: {e}")
+            logger.error("Failed to edit file: %s", e)
             return False
     
     @staticmethod
@@ -85,12 +104,12 @@ class FileManager:
             path = Path(filepath)
             
             if not path.exists():
-                logger.error(f"File does not exist: {filepath}")
+                logger.error("File does not exist: %s", filepath)
                 return None
             
             return path.read_text()
         except Exception as e:
-            logger.error(f"Failed to read file: {e}")
+            logger.error("Failed to read file: %s", e)
             return None
     
     @staticmethod
@@ -109,7 +128,7 @@ class FileManager:
             files = [str(f.relative_to(directory)) for f in path.rglob('*') if f.is_file()]
             return sorted(files)
         except Exception as e:
-            logger.error(f"Failed to list files: {e}")
+            logger.error("Failed to list files: %s", e)
             return []
     
     @staticmethod
@@ -127,12 +146,13 @@ class FileManager:
             path = Path(filepath)
             
             if not path.exists():
-                logger.error(f"File does not exist: {filepath}")
+                logger.error("File does not exist: %s", filepath)
                 return False
             
+            snapshot(path)
             path.unlink()
-            logger.info(f"🗑️  File deleted: {filepath}")
+            logger.info("🗑️  File deleted: %s", filepath)
             return True
         except Exception as e:
-            logger.error(f"Failed to delete file: {e}")
+            logger.error("Failed to delete file: %s", e)
             return False
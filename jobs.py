@@ -0,0 +1,143 @@
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, List, Optional, Callable
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A task submitted to run in the background."""
+
+    def __init__(self, job_id: int, prompt: str):
+        self.id = job_id
+        self.prompt = prompt
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+        self.submitted = datetime.now()
+        self.started: Optional[datetime] = None
+        self.finished: Optional[datetime] = None
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent running (so far, if still running)."""
+        if not self.started:
+            return 0.0
+        return ((self.finished or datetime.now()) - self.started).total_seconds()
+
+    def describe(self) -> str:
+        """One-line summary for job listings."""
+        return f"#{self.id:<3} {self.status:<9} {self.elapsed:6.1f}s  {self.prompt[:60]}"
+
+
+class JobQueue:
+    """Run agent tasks in the background with bounded concurrency."""
+
+    def __init__(self, agent, workers: int = None, on_done: Callable[[Job], None] = None):
+        """
+        Args:
+            agent: Agent used to execute jobs
+            workers: Maximum jobs running at once (defaults to config.job_workers)
+            on_done: Callback invoked from the worker thread when a job finishes
+        """
+        self.agent = agent
+        self.on_done = on_done
+        self.jobs: Dict[int, Job] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers or config.job_workers,
+                                        thread_name_prefix="job")
+
+    def submit(self, prompt: str, **execute_kwargs) -> Job:
+        """
+        Queue a prompt for execution.
+
+        Args:
+            prompt: Task description
+            **execute_kwargs: Extra arguments for Agent.execute
+
+        Returns:
+            The queued job (returned immediately)
+        """
+        with self._lock:
+            job = Job(self._next_id, prompt)
+            self._next_id += 1
+            self.jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, execute_kwargs)
+        return job
+
+    def _run(self, job: Job, execute_kwargs: Dict[str, Any]):
+        if job.cancel_event.is_set():
+            # Cancelled after the worker picked it up but before it started
+            job.status = "cancelled"
+            job.finished = datetime.now()
+            if self.on_done:
+                self.on_done(job)
+            return
+        job.status = "running"
+        job.started = datetime.now()
+        try:
+            job.result = self.agent.execute(job.prompt, cancel_event=job.cancel_event, **execute_kwargs)
+            if job.result.get("cancelled"):
+                job.status = "cancelled"
+            elif "error" in job.result:
+                job.status = "failed"
+            else:
+                job.status = "done"
+        except Exception as e:
+            logger.error("❌ Job #%s failed: %s", job.id, e)
+            job.result = {"error": str(e)}
+            job.status = "failed"
+        finally:
+            job.finished = datetime.now()
+
+        if self.on_done:
+            self.on_done(job)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """Look up a job by id."""
+        return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """All jobs in submission order."""
+        return [self.jobs[i] for i in sorted(self.jobs)]
+
+    def wait(self, job_id: int, timeout: float = None) -> Optional[Job]:
+        """Block until a job finishes (or the timeout expires)."""
+        job = self.get(job_id)
+        if job and job.future:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass  # Status and result are recorded on the job
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job: queued jobs never start, running jobs stop before their next step.
+
+        Returns:
+            True if the job was found and still pending or running
+        """
+        job = self.get(job_id)
+        if not job or job.status not in ("queued", "running"):
+            return False
+        job.cancel_event.set()
+        if job.future and job.future.cancel():
+            job.status = "cancelled"
+            job.finished = datetime.now()
+        return True
+
+    def active(self) -> int:
+        """Number of queued or running jobs."""
+        return sum(1 for job in self.jobs.values() if job.status in ("queued", "running"))
+
+    def shutdown(self):
+        """Cancel everything outstanding and stop the workers."""
+        for job in self.list():
+            self.cancel(job.id)
+        self._pool.shutdown(wait=False, cancel_futures=True)
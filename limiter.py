@@ -0,0 +1,157 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Slot:
+    """One in-flight request; collects the timings used to adapt the limit."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.stats: Dict[str, Any] = {}
+        self.failed = False
+
+    def mark_first_token(self):
+        """Record time-to-first-token (streaming requests)."""
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def record(self, stats: Dict[str, Any]):
+        """Record Ollama's final response timings (nanosecond durations)."""
+        self.stats = stats or {}
+
+    def queue_delay(self) -> float:
+        """
+        Estimate seconds spent waiting rather than computing.
+
+        Ollama reports load_duration, prompt_eval_duration and eval_duration; the rest of
+        the wall time (or of the time-to-first-token when streaming) is queueing and network.
+        A cold model load is not queueing, so it must not shrink the limit.
+        """
+        busy = (self.stats.get("load_duration", 0) + self.stats.get("prompt_eval_duration", 0)) / 1e9
+        if self.first_token is not None:
+            return max(self.first_token - self.started - busy, 0.0)
+        compute = busy + self.stats.get("eval_duration", 0) / 1e9
+        return max(time.perf_counter() - self.started - compute, 0.0)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for requests to one Ollama host.
+
+    The allowed number of in-flight requests grows by ~1 per window of completions
+    while observed queueing delay stays under the target, and is cut multiplicatively
+    (at most once per window) when delay exceeds it or a request fails. Callers block
+    in acquire until a slot is free, so any fan-out converges to the level the server
+    can process without queueing.
+    """
+
+    def __init__(self, initial: int = None, minimum: int = 1, maximum: int = None,
+                 target_delay: float = None, backoff: float = 0.7):
+        self.limit = float(initial or config.initial_concurrency)
+        self.minimum = minimum
+        self.maximum = maximum or config.max_concurrency
+        self.target_delay = config.target_queue_delay if target_delay is None else target_delay
+        self.backoff = backoff
+        self.in_flight = 0
+        self._completed = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+        # Coroutines waiting for a slot: (loop, future) pairs woken on release
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @contextmanager
+    def slot(self):
+        """Hold one request slot for the duration of the block."""
+        slot = self._acquire()
+        try:
+            yield slot
+        except Exception:
+            slot.failed = True
+            raise
+        finally:
+            self._release(slot)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot(): waits without blocking the event loop."""
+        slot = await self._aacquire()
+        try:
+            yield slot
+        except Exception:
+            slot.failed = True
+            raise
+        finally:
+            self._release(slot)
+
+    async def _aacquire(self) -> Slot:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return Slot()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _acquire(self) -> Slot:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return Slot()
+
+    def _release(self, slot: Slot):
+        delay = slot.queue_delay()
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self._completed += 1
+
+            if slot.failed or delay > self.target_delay:
+                # Multiplicative decrease, once per window of completions
+                if self._completed - self._last_decrease >= int(self.limit):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = self._completed
+                    logger.debug("Concurrency limit down to %.2f (delay %.2fs)", self.limit, delay)
+            elif saturated:
+                # Additive increase: +1 per window, only when the limit was actually in use
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state for status displays."""
+        with self._condition:
+            return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "completed": self._completed}
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def limiter_for(host: str) -> AdaptiveLimiter:
+    """Return the limiter shared by every client talking to `host`."""
+    with _registry_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter()
+        return _limiters[host]
@@ -0,0 +1,148 @@
+"""
+Logging setup: a queue handler on the root logger so callers only enqueue records,
+and a background listener that formats them (console text and optional JSON lines)
+off the calling thread. Every record carries the correlation id of the execute
+call it belongs to.
+"""
+
+import sys
+import json
+import uuid
+import queue
+import atexit
+import inspect
+import logging
+import functools
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and goes into JSON output
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "correlation_id"}
+
+_correlation_id: contextvars.ContextVar = contextvars.ContextVar("correlation_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+def correlation_id() -> Optional[str]:
+    """Correlation id of the current execute call (None outside one)."""
+    return _correlation_id.get()
+
+
+def correlated(func):
+    """
+    Run a function (or coroutine function) under a fresh correlation id.
+
+    Nested calls keep the outer id, so one user request logs under a single id.
+    """
+    def start():
+        return _correlation_id.set(_correlation_id.get() or uuid.uuid4().hex[:12])
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = start()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _correlation_id.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _correlation_id.reset(token)
+    return wrapper
+
+
+class _CorrelationFilter(logging.Filter):
+    """Stamp records with the correlation id while still on the logging thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = _correlation_id.get()
+        return True
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records as-is; message interpolation happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging(level: str = "INFO", module_levels: Dict[str, str] = None,
+                  console: str = "text", json_file: Path = None):
+    """
+    Route all logging through a queue to a background listener (idempotent).
+
+    Args:
+        level: Root log level
+        module_levels: Per-logger levels, e.g. {"ollama_client": "DEBUG"}
+        console: Console (stderr) output: "text", "json" or "off"
+        json_file: Also append JSON lines to this file
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level.upper())
+    if _listener is not None:
+        return
+
+    handlers = []
+    if console != "off":
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JsonFormatter() if console == "json" else logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(stream)
+    if json_file:
+        Path(json_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.FileHandler(json_file, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _LazyQueueHandler(log_queue)
+    _queue_handler.addFilter(_CorrelationFilter())
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(flush_logging)
+
+
+def flush_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
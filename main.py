@@ -5,20 +5,22 @@ A clean, simple CLI for interacting with local LLMs for code generation and file
 """
 
 import click
+import cProfile
+import json
 import logging
+import pstats
 import sys
+import threading
+from datetime import datetime
 from colorama import Fore, Back, Style, init
-from agent import Agent
 from config import config
+from tracing import tracer
+import daemon
+from jobs import JobQueue, Job
 
 # Initialize colorama for cross-platform colors
 init(autoreset=True)
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
@@ -47,21 +49,152 @@ def print_info(msg: str):
     print(f"{Fore.BLUE}ℹ️  {msg}{Style.RESET_ALL}")
 
 
+STEP_TITLES = {
+    "thinking": "💭 Thinking:",
+    "plan": "📋 Plan:",
+    "implementation": "✨ Implementation:",
+}
+
+
+def print_step(name: str, text: str):
+    """Print the output of one workflow step."""
+    print(f"\n{Fore.CYAN}{STEP_TITLES.get(name, name)}{Style.RESET_ALL}")
+    print(f"{Fore.WHITE}{text}{Style.RESET_ALL}\n")
+
+
+def print_result(result: dict):
+    """Print the workflow steps of an execution result."""
+    for name in ("thinking", "plan", "implementation"):
+        if name in result:
+            print_step(name, result[name])
+
+
+def print_interrupted(result: dict):
+    """Show what an interrupted task produced before it was stopped."""
+    print_result(result)
+    partial = result.get("partial")
+    if partial:
+        title = STEP_TITLES.get(partial["step"], partial["step"]).rstrip(":")
+        print(f"\n{Fore.CYAN}{title} (interrupted):{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}{partial['text']}{Style.RESET_ALL}\n")
+    print_info("Generation stopped; completed steps are kept. Type 'resume' to continue.\n")
+
+
+def confirm_cached(hit: dict) -> bool:
+    """Ask whether to reuse a cached result for a similar earlier prompt (SEMANTIC_CACHE=offer)."""
+    print_info(f"A similar prompt was answered before ({hit['similarity']:.0%} similar, {hit['created'][:16]}):")
+    print(f"  {Fore.YELLOW}{hit['prompt'][:100]}{Style.RESET_ALL}")
+    return click.confirm("Reuse that result?", default=True)
+
+
+_print_lock = threading.Lock()
+
+
+def print_job_done(job: Job):
+    """Stream a finished background job's result into the interactive session."""
+    with _print_lock:
+        print()
+        if job.status == "done":
+            print_success(f"Job #{job.id} finished in {job.elapsed:.1f}s: {job.prompt[:60]}")
+            print_result(job.result)
+        else:
+            print_error(f"Job #{job.id} {job.status}: {(job.result or {}).get('error', '')}")
+        sys.stdout.write(f"{Fore.YELLOW}➜ {Style.RESET_ALL}")
+        sys.stdout.flush()
+
+
+def create_agent(model: str = None):
+    """Create an Agent (imported lazily so daemon clients start fast)."""
+    from agent import Agent
+    return Agent(model=model)
+
+
+def daemon_client(ctx: click.Context):
+    """
+    Return a client for a running daemon, unless disabled with --no-daemon.
+    
+    Commands run in-process when a cassette, --trace or --profile is active, since those
+    only see work done in this process.
+    """
+    if ctx.obj.get("no_daemon") or config.cassette or tracer.enabled or ctx.obj.get("profiling"):
+        return None
+    return daemon.connect()
+
+
 @click.group()
-def cli():
+@click.option('--trace', is_flag=True, help='Record timing spans to a trace file (chrome://tracing / Perfetto)')
+@click.option('--profile', is_flag=True, help='Record cProfile stats for the command')
+@click.option('--no-daemon', is_flag=True, help='Run in-process even if an agent daemon is running')
+@click.option('--session', default=None, envvar='AGENT_SESSION',
+              help='Named session to use, so several agents can share one workspace')
+@click.option('--record', 'record', default=None, metavar='CASSETTE',
+              help='Record all HTTP traffic (Ollama and web) to a cassette file')
+@click.option('--replay', 'replay', default=None, metavar='CASSETTE',
+              help='Serve HTTP responses from a recorded cassette instead of the network')
+@click.option('--replay-timing', type=click.Choice(['none', 'recorded']), default=None,
+              help='Replay instantly (none) or with the recorded latencies')
+@click.pass_context
+def cli(ctx, trace, profile, no_daemon, session, record, replay, replay_timing):
     """CLIAgent - AI Coding Agent CLI"""
-    pass
+    if record and replay:
+        raise click.UsageError("--record and --replay are mutually exclusive")
+    if record or replay:
+        config.cassette = record or replay
+        config.cassette_mode = "record" if record else "replay"
+    if replay_timing:
+        config.replay_timing = replay_timing
+    ctx.obj = {"no_daemon": no_daemon, "profiling": profile}
+    if session:
+        try:
+            config.session_file(session)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--session')
+        config.session_name = session
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    if trace:
+        tracer.enable()
+        
+        def write_trace():
+            trace_file = config.state_dir / f"trace_{stamp}.json"
+            tracer.write(trace_file)
+            print(f"\n{Fore.CYAN}⏱️  Trace:{Style.RESET_ALL}", file=sys.stderr)
+            print(tracer.summary(), file=sys.stderr)
+            print_info(f"Trace written to {trace_file}")
+        
+        ctx.call_on_close(write_trace)
+    
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        
+        def write_profile():
+            profiler.disable()
+            profile_file = config.state_dir / f"profile_{stamp}.prof"
+            profiler.dump_stats(profile_file)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(20)
+            print_info(f"Profile written to {profile_file}")
+        
+        ctx.call_on_close(write_profile)
 
 
 @cli.command()
 @click.option('--model', default=None, help='Model to use (default: mistral)')
 @click.option('--workflow', is_flag=True, default=True, help='Use think-prepare-implement workflow')
+@click.option('--tools', is_flag=True, help='Let the model call tools (files, web) in a chat loop')
+@click.option('--race', type=int, default=None, help='Race N implement-step candidates, keep the first valid one')
 @click.argument('prompt', required=True, nargs=-1)
-def task(model, workflow, prompt):
+@click.pass_context
+def task(ctx, model, workflow, tools, race, prompt):
     """Execute a task with the AI agent."""
     print_header()
     
-    agent = Agent(model=model)
+    client = daemon_client(ctx)
+    if client:
+        run_task_remote(client, " ".join(prompt), model, workflow, tools, race)
+        return
+    
+    agent = create_agent(model=model)
     
     # Check if Ollama is available
     if not agent.client.is_available():
@@ -74,39 +207,112 @@ def task(model, workflow, prompt):
     if model:
         print_info(f"Using model: {model}\n")
     
-    result = agent.execute(prompt_text, use_workflow=workflow)
+    result = agent.execute(prompt_text, use_workflow=workflow, use_tools=tools, race=race,
+                           on_cache_hit=confirm_cached)
     
     if "error" in result:
         print_error(result["error"])
         return
     
     # Display results
-    if "thinking" in result:
-        print(f"\n{Fore.CYAN}💭 Thinking:{Style.RESET_ALL}")
-        print(f"{Fore.WHITE}{result['thinking']}{Style.RESET_ALL}\n")
+    print_result(result)
+    
+    print_success("Task completed. Session saved.")
+
+
+def run_task_remote(client: "daemon.DaemonClient", prompt_text: str, model: str, workflow: bool,
+                    tools: bool = False, race: int = None):
+    """Run a task on the resident daemon, printing steps as they stream in."""
+    print_info(f"Prompt: {prompt_text} (via daemon)\n")
+    
+    for message in client.request("task", prompt=prompt_text, model=model, workflow=workflow,
+                                  tools=tools, race=race, session=config.session_name):
+        kind = message.get("type")
+        if kind == "log":
+            print(message["message"], file=sys.stderr)
+        elif kind == "step":
+            print_step(message["name"], message["text"])
+        elif kind == "error":
+            print_error(message["error"])
+            return
+        elif kind == "result" and "error" in message["result"]:
+            print_error(message["result"]["error"])
+            return
+    
+    print_success("Task completed. Session saved.")
+
+
+@cli.command()
+@click.option('--model', default=None, help='Model to use')
+def resume(model):
+    """Resume the last unfinished task from its last completed step."""
+    print_header()
     
-    if "plan" in result:
-        print(f"{Fore.CYAN}📋 Plan:{Style.RESET_ALL}")
-        print(f"{Fore.WHITE}{result['plan']}{Style.RESET_ALL}\n")
+    agent = create_agent(model=model)
+    checkpoint = agent.session_state.get("checkpoint")
+    if not checkpoint:
+        print_info("Nothing to resume")
+        return
     
-    print(f"{Fore.CYAN}✨ Implementation:{Style.RESET_ALL}")
-    print(f"{Fore.WHITE}{result['implementation']}{Style.RESET_ALL}\n")
+    if not agent.client.is_available():
+        print_error("Ollama is not running. Start it with: ollama serve")
+        return
+    
+    done = ", ".join(checkpoint["steps"]) or "none"
+    print_info(f"Resuming: {checkpoint['prompt']} (completed steps: {done})\n")
+    result = agent.execute(resume=True)
     
+    print_result(result)
+    if "error" in result:
+        print_error(result["error"])
+        return
     print_success("Task completed. Session saved.")
 
 
+@cli.command()
+@click.argument('prompts_file', type=click.File('r'), default='-')
+@click.option('--concurrency', '-c', default=4, show_default=True, help='Tasks to run at once')
+@click.option('--model', default=None, help='Model to use')
+@click.option('--no-workflow', is_flag=True, help='Single generation per task instead of think-prepare-implement')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='JSONL results file (default: stdout)')
+def batch(prompts_file, concurrency, model, no_workflow, output):
+    """Run many prompts (JSONL file or stdin) with bounded concurrency."""
+    from batch import read_prompts, run_batch
+    
+    prompts = read_prompts(prompts_file)
+    if not prompts:
+        print_error("No prompts to run")
+        return
+    
+    def write_result(record):
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+    
+    print(f"{Fore.BLUE}ℹ️  Running {len(prompts)} task(s) with concurrency {concurrency}{Style.RESET_ALL}",
+          file=sys.stderr)
+    summary = run_batch(prompts, concurrency, model, not no_workflow, on_result=write_result)
+    print(f"{Fore.GREEN}✅ {summary['ok']}/{summary['tasks']} succeeded in {summary['wall_seconds']}s "
+          f"({summary['tasks_per_minute']} tasks/min, parallelism {summary['effective_parallelism']}){Style.RESET_ALL}",
+          file=sys.stderr)
+    print(json.dumps({"summary": summary}), file=sys.stderr)
+
+
 @cli.command()
 @click.option('--model', default=None, help='Model to use')
 def interactive(model):
     """Start interactive session."""
     print_header()
     
-    agent = Agent(model=model)
+    agent = create_agent(model=model)
     
     if not agent.client.is_available():
         print_error("Ollama is not running. Start it with: ollama serve")
         return
     
+    # Load the model while the user is typing the first prompt
+    agent.client.preload_async()
+    queue = JobQueue(agent, on_done=print_job_done)
+    
     print(agent.show_status())
     print_info("Type 'exit' to quit, 'help' for commands\n")
     
@@ -118,6 +324,9 @@ def interactive(model):
             user_input = sys.stdin.readline().strip()
             
             if user_input.lower() in ['exit', 'quit']:
+                if queue.active():
+                    print_info(f"Cancelling {queue.active()} background job(s)")
+                queue.shutdown()
                 print_success("Goodbye!")
                 break
             
@@ -140,6 +349,39 @@ def interactive(model):
                 print_info(result)
                 continue
             
+            if user_input.startswith('bg:'):
+                job = queue.submit(user_input[3:].strip())
+                print_info(f"Job #{job.id} queued ({queue.active()} active)\n")
+                continue
+            
+            if user_input.lower() == 'jobs':
+                jobs = queue.list()
+                if not jobs:
+                    print_info("No background jobs\n")
+                for job in jobs:
+                    print(f"  {job.describe()}")
+                continue
+            
+            if user_input.lower().startswith(('wait ', 'cancel ')):
+                command, _, job_id = user_input.partition(' ')
+                job_id = job_id.strip().lstrip('#')
+                job = queue.get(int(job_id)) if job_id.isdigit() else None
+                if not job:
+                    print_error(f"Unknown job: {job_id}")
+                    continue
+                if command.lower() == 'cancel':
+                    if queue.cancel(job.id):
+                        print_success(f"Job #{job.id} cancelled\n")
+                    else:
+                        print_info(f"Job #{job.id} already {job.status}\n")
+                    continue
+                queue.wait(job.id)
+                if job.status == "done":
+                    print_result(job.result)
+                else:
+                    print_error(f"Job #{job.id} {job.status}: {(job.result or {}).get('error', '')}")
+                continue
+            
             if user_input.lower() == 'session:info':
                 state = agent.session_state
                 print(f"\n{Fore.CYAN}📋 Current Session Info:{Style.RESET_ALL}")
@@ -151,10 +393,24 @@ def interactive(model):
             
             if user_input.lower() == 'session:reset':
                 config.reset_session()
-                agent = Agent()  # Reinitialize with fresh state
+                agent = create_agent()  # Reinitialize with fresh state
+                queue.agent = agent
                 print_success("Session reset - starting fresh\n")
                 continue
             
+            if user_input.lower() == 'changes':
+                print_changes()
+                continue
+            
+            if user_input.lower() == 'undo' or user_input.lower().startswith('undo '):
+                from file_history import FileHistory
+                
+                args = user_input.split()[1:]
+                force = '--force' in args
+                ids = [a for a in args if a != '--force']
+                print_undo(FileHistory().undo(ids[0] if ids else None, force=force))
+                continue
+            
             if user_input.lower() == 'session:archive':
                 archived_path = config.archive_session()
                 if archived_path:
@@ -166,24 +422,28 @@ def interactive(model):
             if not user_input:
                 continue
             
-            print_info("Processing your request...")
-            result = agent.execute(user_input)
+            try:
+                if user_input.lower() == 'resume':
+                    print_info("Resuming last unfinished task...")
+                    result = agent.execute(resume=True)
+                else:
+                    print_info("Processing your request... (Ctrl-C to stop)")
+                    result = agent.execute(user_input, on_cache_hit=confirm_cached)
+            except KeyboardInterrupt:
+                # Interrupted outside a generation step (steps turn Ctrl-C into a cancelled result)
+                result = {"error": "Interrupted", "cancelled": True}
+            
+            if result.get("cancelled"):
+                print_interrupted(result)
+                continue
             
             if "error" in result:
                 print_error(result["error"])
                 continue
             
-            if "thinking" in result:
-                print(f"\n{Fore.CYAN}💭 Thinking:{Style.RESET_ALL}")
-                print(f"{Fore.WHITE}{result['thinking']}{Style.RESET_ALL}\n")
-            
-            if "plan" in result:
-                print(f"{Fore.CYAN}📋 Plan:{Style.RESET_ALL}")
-                print(f"{Fore.WHITE}{result['plan']}{Style.RESET_ALL}\n")
+            print_result(result)
             
             if "implementation" in result:
-                print(f"{Fore.CYAN}✨ Implementation:{Style.RESET_ALL}")
-                print(f"{Fore.WHITE}{result['implementation']}{Style.RESET_ALL}\n")
                 print_success("Task completed!")
         
         except KeyboardInterrupt:
@@ -195,34 +455,106 @@ def interactive(model):
 
 @cli.command()
 @click.option('--model', default=None, help='Model to use')
-def models(model):
+@click.pass_context
+@click.option('--bench', is_flag=True, help='Benchmark installed models on this host and save the profile')
+def models(ctx, model, bench):
     """List available Ollama models."""
     print_header()
     
-    agent = Agent(model=model)
+    client = daemon_client(ctx)
+    if client and not bench:
+        available = next(m for m in client.request("models") if m["type"] in ("result", "error")).get("result", [])
+        print_model_list(available)
+        return
+    
+    agent = create_agent(model=model)
     
     if not agent.client.is_available():
         print_error("Ollama is not running")
         return
     
-    available = agent.get_available_models()
+    if bench:
+        from model_profile import bench_models
+        
+        targets = [model] if model else None
+        print_info(f"Benchmarking {model or 'all installed models'} (each is unloaded first to time a cold load)\n")
+        bench_models(agent.client, targets,
+                     on_result=lambda name, p: print(f"  {Fore.GREEN}{name}{Style.RESET_ALL}: "
+                                                     f"{format_profile(p)}"))
+        print_success("Profile saved")
     
+    print_model_list(agent.get_available_models())
+
+
+def format_profile(profile: dict) -> str:
+    """One-line summary of a model's benchmark results."""
+    return (f"{profile.get('parameter_size') or '?'} params, load {profile['load_seconds']}s, "
+            f"prompt {profile['prompt_tps']} tok/s, generate {profile['gen_tps']} tok/s")
+
+
+def print_model_list(available: list):
+    """Print a numbered list of models (with benchmark results when profiled)."""
+    from model_profile import load_profile, select_model
+    
+    profile = load_profile()
     if available:
         print(f"{Fore.CYAN}Available Models:{Style.RESET_ALL}")
         for i, m in enumerate(available, 1):
-            print(f"  {i}. {Fore.GREEN}{m}{Style.RESET_ALL}")
+            stats = f"  ({format_profile(profile[m])})" if m in profile else ""
+            print(f"  {i}. {Fore.GREEN}{m}{Style.RESET_ALL}{stats}")
+        if profile:
+            fastest = select_model()
+            if fastest:
+                print_info(f"Fastest in tier '{config.model_tier}': {fastest}")
     else:
         print_error("No models found")
 
 
 @cli.command()
-def status():
+@click.pass_context
+def status(ctx):
     """Show agent status."""
     print_header()
-    agent = Agent()
+    client = daemon_client(ctx)
+    if client:
+        reply = next(m for m in client.request("status") if m["type"] in ("result", "error"))
+        print(reply.get("result") or reply.get("error"))
+        print_info(f"Served by daemon on {client.path}")
+        return
+    agent = create_agent()
     print(agent.show_status())
 
 
+@cli.command()
+@click.option('--model', default=None, help='Model to keep loaded')
+@click.option('--stop', is_flag=True, help='Stop a running daemon')
+def serve(model, stop):
+    """Run a resident agent daemon on a local Unix socket."""
+    if stop:
+        client = daemon.connect()
+        if not client:
+            print_info("No daemon running")
+            return
+        list(client.request("shutdown"))
+        print_success("Daemon stopped")
+        return
+    
+    print_header()
+    try:
+        server = daemon.AgentDaemon(model=model)
+    except Exception as e:
+        print_error(f"Failed to start daemon: {e}")
+        return
+    
+    print_info(f"Serving on {server.path} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_success("Daemon stopped")
+    except RuntimeError as e:
+        print_error(str(e))
+
+
 @cli.command()
 @click.argument('filepath', required=True)
 @click.argument('content', required=True)
@@ -230,7 +562,7 @@ def status():
 def create(filepath, content, overwrite):
     """Create a file directly."""
     print_header()
-    agent = Agent()
+    agent = create_agent()
     
     if agent.create_file(filepath, content, overwrite):
         print_success(f"File created: {filepath}")
@@ -249,6 +581,13 @@ def print_help_commands():
   session:info     - Show current session info
   session:reset    - Start a fresh session
   session:archive  - Archive current session
+  resume           - Resume the last unfinished task from its checkpoint
+  changes          - List file changes made by recent tasks
+  undo [id]        - Revert the files changed by the last task (or changeset id)
+  bg:<prompt>      - Run a task in the background (returns a job id)
+  jobs             - List background jobs
+  wait <id>        - Wait for a job and show its result
+  cancel <id>      - Cancel a queued or running job
   exit/quit        - Exit the session
   <prompt>         - Execute a task with AI agent
 """
@@ -261,7 +600,7 @@ def web():
     print_header()
     
     url = click.prompt("Enter URL to fetch")
-    agent = Agent()
+    agent = create_agent()
     
     content = agent.fetch_web(url)
     print(f"\n{Fore.CYAN}Content ({len(content)} chars):{Style.RESET_ALL}")
@@ -269,10 +608,14 @@ def web():
 
 
 @cli.command()
-def session_info():
-    """Show current session information."""
+@click.argument('archive_id', required=False)
+def session_info(archive_id):
+    """Show current session information (or an archived session's)."""
     print_header()
-    agent = Agent()
+    if archive_id:
+        print_archive_info(archive_id)
+        return
+    agent = create_agent()
     state = agent.session_state
     
     print(f"\n{Fore.CYAN}📋 Current Session Info:{Style.RESET_ALL}")
@@ -296,6 +639,65 @@ def session_reset():
     print_success("✅ Session reset - starting fresh\n")
 
 
+def print_archive_info(archive_id: str):
+    """Show an archived session's summary (reads only its manifest)."""
+    info = config.archive_store.info(archive_id)
+    if not info:
+        print_error(f"No archived session {archive_id}")
+        return
+    
+    print(f"\n{Fore.CYAN}📦 Archived Session {info['id']}:{Style.RESET_ALL}")
+    print(f"  {Fore.YELLOW}Archived:{Style.RESET_ALL} {info['archived_at']}")
+    print(f"  {Fore.YELLOW}Messages:{Style.RESET_ALL} {info['messages']}")
+    print(f"  {Fore.YELLOW}Files Created:{Style.RESET_ALL} {info['files_created_count']}")
+    
+    if info['files_created']:
+        print(f"\n  Files:")
+        for f in info['files_created']:
+            print(f"    - {f}")
+    
+    print(f"\n  {Fore.YELLOW}Last Prompt:{Style.RESET_ALL} {info['last_prompt'] or 'None'}")
+    print(f"  {Fore.YELLOW}Session Start:{Style.RESET_ALL} {info.get('session_start') or 'Unknown'}\n")
+
+
+@cli.command()
+def session_list():
+    """List archived sessions."""
+    print_header()
+    archives = config.archive_store.list()
+    if not archives:
+        print_info("No archived sessions")
+        return
+    
+    print(f"{Fore.CYAN}Archived Sessions:{Style.RESET_ALL}")
+    for info in archives:
+        print(f"  {Fore.GREEN}{info['id']}{Style.RESET_ALL}  {info['messages']} message(s)  "
+              f"{info['last_prompt'][:50]}")
+
+
+@cli.command()
+@click.argument('archive_id')
+def session_restore(archive_id):
+    """Restore an archived session as the current session (the current one is archived first)."""
+    print_header()
+    state = config.archive_store.load(archive_id)
+    if state is None:
+        print_error(f"No archived session {archive_id}")
+        return
+    config.archive_session()
+    config.save_session_state(state)
+    print_success(f"Restored session {archive_id}\n")
+
+
+@cli.command()
+def session_compact():
+    """Convert old session_*.json archives into the compressed archive store."""
+    print_header()
+    converted = config.compact_archives()
+    size = config.archive_store.size()
+    print_success(f"Converted {converted} archive(s); archive store uses {size / 1024:.1f} KiB\n")
+
+
 @cli.command()
 def session_archive():
     """Archive current session."""
@@ -307,5 +709,84 @@ def session_archive():
         print_info("ℹ️  No session to archive\n")
 
 
+
+def print_changes(changeset_id: str = None, limit: int = 10):
+    """List recorded changesets, or the files of one."""
+    from file_history import FileHistory
+    
+    history = FileHistory()
+    if changeset_id:
+        changeset = history.get(changeset_id)
+        if not changeset:
+            print_error(f"No changeset {changeset_id}")
+            return
+        changesets = [changeset]
+    else:
+        changesets = history.list()[:limit]
+        if not changesets:
+            print_info("No recorded changes")
+            return
+    
+    for changeset in changesets:
+        status = f"  {Fore.YELLOW}(undone){Style.RESET_ALL}" if changeset.get("undone") else ""
+        print(f"{Fore.GREEN}{changeset['id']}{Style.RESET_ALL}  {changeset['description'][:60]}{status}")
+        for path, change in changeset["changes"].items():
+            if change["before"] is None:
+                marker = "+"
+            elif change.get("after") is None and "after" in change:
+                marker = "-"
+            else:
+                marker = "~"
+            print(f"    {marker} {path}")
+    print()
+
+
+def print_undo(result: dict):
+    """Report the outcome of an undo."""
+    if "error" in result:
+        print_error(result["error"])
+        return
+    for path in result["restored"]:
+        print(f"  ~ {path}")
+    for path in result["removed"]:
+        print(f"  - {path}")
+    if result["conflicts"]:
+        print_error(f"Skipped {len(result['conflicts'])} file(s) edited since; "
+                    f"use 'undo {result['id']} --force' to overwrite them:")
+        for path in result["conflicts"]:
+            print(f"  ! {path}")
+    else:
+        print_success(f"Undid {result['id']}: {result['description'][:60]}\n")
+
+
+@cli.command()
+@click.argument('changeset_id', required=False)
+@click.option('--limit', default=10, help='Changesets to show')
+def changes(changeset_id, limit):
+    """List file changes made by recent tasks (+ created, ~ modified, - deleted)."""
+    print_header()
+    print_changes(changeset_id, limit)
+
+
+@cli.command()
+@click.argument('changeset_id', required=False)
+@click.option('--force', is_flag=True, help='Also restore files edited since the change')
+def undo(changeset_id, force):
+    """Revert the file changes of the last task (or of CHANGESET_ID)."""
+    from file_history import FileHistory
+    
+    print_header()
+    print_undo(FileHistory().undo(changeset_id, force=force))
+
+
+@cli.command()
+def cache_clear():
+    """Delete all semantic prompt cache entries."""
+    from semantic_cache import get_cache
+    
+    get_cache().clear()
+    print_success("Semantic cache cleared")
+
+
 if __name__ == '__main__':
     cli()
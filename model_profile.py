@@ -0,0 +1,174 @@
+import re
+import json
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+from config import config
+from atomic_write import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Fixed, short prompts so profiles are comparable across models and runs
+BENCH_PROMPTS = [
+    "Write a Python function that returns the n-th Fibonacci number.",
+    "Explain in two sentences what a race condition is.",
+    "List three ways to speed up a slow SQL query.",
+]
+
+# Deterministic, capped generations keep a benchmark run short
+BENCH_OPTIONS = {"num_predict": 64, "temperature": 0, "seed": 0}
+
+
+def parameter_billions(parameter_size: str) -> float:
+    """Convert Ollama's parameter_size ("7.2B", "137M") to billions (0.0 if unknown)."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMBT]?)\s*', parameter_size or "", re.IGNORECASE)
+    if not match:
+        return 0.0
+    scale = {"": 1e-9, "K": 1e-6, "M": 1e-3, "B": 1.0, "T": 1e3}[match.group(2).upper()]
+    return float(match.group(1)) * scale
+
+
+def profile_file() -> Path:
+    """Location of the persisted model profile."""
+    return config.state_dir / "model_profile.json"
+
+
+def load_profile(host: str = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Load benchmark results for the models on a host.
+
+    Returns:
+        Mapping of model name to its profile ({} if never benchmarked)
+    """
+    path = profile_file()
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get(host or config.ollama_host, {})
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning("Model profile unreadable, ignoring it: %s", e)
+        return {}
+
+
+def save_profile(models: Dict[str, Dict[str, Any]], host: str = None):
+    """Persist benchmark results for a host, keeping other hosts' profiles."""
+    path = profile_file()
+    profiles = {}
+    if path.exists():
+        try:
+            with open(path, 'r') as f:
+                profiles = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            pass
+    profiles[host or config.ollama_host] = models
+    write_atomic(path, json.dumps(profiles, indent=2).encode())
+
+
+def bench_model(client, model: str, prompts: List[str] = None) -> Dict[str, Any]:
+    """
+    Measure one model on this host.
+
+    The model is unloaded first so the first request includes a cold load.
+
+    Args:
+        client: OllamaClient to use
+        model: Model name
+        prompts: Prompts to run (defaults to BENCH_PROMPTS)
+
+    Returns:
+        Profile with load_seconds, prompt_tps and gen_tps (tokens/second)
+    """
+    prompts = prompts or BENCH_PROMPTS
+    client.unload(model)
+
+    start = time.perf_counter()
+    results = [client.generate_stats(prompt, model, options=dict(BENCH_OPTIONS)) for prompt in prompts]
+    wall = time.perf_counter() - start
+
+    def rate(count_key: str, duration_key: str) -> float:
+        count = sum(r.get(count_key, 0) for r in results)
+        seconds = sum(r.get(duration_key, 0) for r in results) / 1e9
+        return round(count / seconds, 1) if seconds else 0.0
+
+    return {
+        "load_seconds": round(results[0].get("load_duration", 0) / 1e9, 3),
+        "prompt_tps": rate("prompt_eval_count", "prompt_eval_duration"),
+        "gen_tps": rate("eval_count", "eval_duration"),
+        "bench_seconds": round(wall, 3),
+        "benchmarked_at": datetime.now().isoformat(),
+    }
+
+
+def bench_models(client, models: List[str] = None,
+                 on_result: Callable[[str, Dict[str, Any]], None] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Benchmark installed models and save the results under the state directory.
+
+    Args:
+        client: OllamaClient to use
+        models: Models to benchmark (defaults to every installed model)
+        on_result: Callback invoked with (model, profile) as each model finishes
+
+    Returns:
+        The updated profile for the client's host
+    """
+    installed = {m['name']: m for m in client.model_details()}
+    profile = load_profile(client.host)
+
+    for name in models or list(installed):
+        details = installed.get(name, {})
+        parameter_size = details.get("details", {}).get("parameter_size", "")
+        try:
+            result = bench_model(client, name)
+        except Exception as e:
+            logger.error("❌ Benchmark failed for %s: %s", name, e)
+            continue
+        result.update({
+            "size": details.get("size", 0),
+            "parameter_size": parameter_size,
+            "parameters_b": parameter_billions(parameter_size),
+        })
+        profile[name] = result
+        if on_result:
+            on_result(name, result)
+
+    # Forget models that are no longer installed
+    if installed:
+        profile = {name: p for name, p in profile.items() if name in installed}
+    save_profile(profile, client.host)
+    return profile
+
+
+def select_model(tier: str = None, host: str = None) -> Optional[str]:
+    """
+    Pick the fastest benchmarked model whose size meets a tier.
+
+    Args:
+        tier: Key of config.model_tiers (defaults to config.model_tier)
+        host: Ollama host whose profile to use
+
+    Returns:
+        Model name, or None if no benchmarked model qualifies
+    """
+    tier = tier or config.model_tier
+    if tier not in config.model_tiers:
+        logger.warning("Unknown model tier '%s', expected one of %s", tier, ', '.join(config.model_tiers))
+        return None
+    minimum = config.model_tiers[tier]
+
+    candidates = [(p.get("gen_tps", 0), name) for name, p in load_profile(host).items()
+                  if p.get("parameters_b", 0) >= minimum and p.get("gen_tps")]
+    return max(candidates)[1] if candidates else None
+
+
+def route_steps(host: str = None) -> Dict[str, str]:
+    """Map workflow steps to models according to config.step_model_tiers."""
+    routes = {}
+    for step, tier in config.step_model_tiers.items():
+        model = select_model(tier, host)
+        if model:
+            routes[step] = model
+    return routes
@@ -1,40 +1,213 @@
+import re
+import ast
+import json
 import requests
 import logging
-from typing import Optional, Dict, Any
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Callable, List, Iterator, Set, Tuple
 from config import config
+from limiter import AdaptiveLimiter, limiter_for
+from transport import new_session
+from tracing import tracer, traced
 
 logger = logging.getLogger(__name__)
 
 
+class GenerationCancelled(Exception):
+    """Raised when a workflow is cancelled (between steps, or mid-step with partial output)."""
+    
+    def __init__(self, message: str = "Cancelled", step: str = None, partial: str = ""):
+        super().__init__(message)
+        self.step = step
+        self.partial = partial
+
+
+class StepFailed(Exception):
+    """Raised when a workflow step produces no output (e.g. the request failed)."""
+
+
+def _check_cancelled(cancel_event: Optional[threading.Event]):
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled("Cancelled")
+
+
+def _check_output(step: str, output: str):
+    if not output:
+        raise StepFailed(f"The {step} step returned no output")
+
+
+# Rough characters-per-token ratio used to size the context window
+CHARS_PER_TOKEN = 4
+
+# Workflow step prompts (shared with the async workflow in async_client)
+THINK_PROMPT = """Analyze this request and break down what needs to be done:
+{prompt}
+
+Provide a clear analysis in 2-3 sentences."""
+
+PREPARE_PROMPT = """Based on this analysis:
+{thinking}{references}
+
+Create a detailed step-by-step plan to execute this request. Be specific and actionable."""
+
+IMPLEMENT_PROMPT = """Following this plan:
+{plan}{references}
+
+Now provide the implementation code, commands, or detailed steps to execute this. Be thorough and production-ready."""
+
+
+def generation_options(step: str, prompt: str) -> Dict[str, Any]:
+    """
+    Build Ollama generation options for a workflow step.
+    
+    Args:
+        step: Step name (think, prepare, implement or default)
+        prompt: The prompt that will be sent
+    
+    Returns:
+        Options dict with num_ctx sized to fit the prompt plus the output cap
+    """
+    options = dict(config.step_options.get(step, config.step_options["default"]))
+    
+    if config.num_ctx:
+        options["num_ctx"] = config.num_ctx
+    elif "num_ctx" not in options:
+        needed = len(prompt) // CHARS_PER_TOKEN + max(options.get("num_predict", 0), 0)
+        # Power-of-two buckets keep num_ctx stable across calls (changing it forces a model reload)
+        num_ctx = config.min_num_ctx
+        while num_ctx < needed and num_ctx < config.max_num_ctx:
+            num_ctx *= 2
+        options["num_ctx"] = min(num_ctx, config.max_num_ctx)
+    
+    return options
+
+
 class OllamaClient:
     """Client for interacting with local Ollama LLMs."""
     
-    def __init__(self, host: str = None, model: str = None):
+    def __init__(self, host: str = None, model: str = None, session: requests.Session = None,
+                 unload_on_switch: bool = None):
         self.host = host or config.ollama_host
         self.model = model or config.default_model
         self.api_endpoint = f"{self.host}/api/generate"
+        # Reuse connections across calls (keeps the HTTP pool warm); may be shared between clients
+        self.session = session or new_session()
+        # Whether set_model releases the previous model (off when other clients may still use it)
+        self.unload_on_switch = config.unload_on_switch if unload_on_switch is None else unload_on_switch
+        # Largest num_ctx sent per model; never shrunk, since a change forces a reload
+        self._num_ctx: Dict[str, int] = {}
+        # Models this client has sent requests for: the only ones it may unload, since other
+        # agents on the same server may be using the rest
+        self._used: Set[str] = set()
+        # Generation requests share one adaptive concurrency limit per host
+        if config.adaptive_concurrency:
+            self.limiter = limiter_for(self.host)
+        else:
+            self.limiter = AdaptiveLimiter(initial=10**6, maximum=10**6, target_delay=float('inf'))
     
     def list_models(self) -> list:
         """List available models on Ollama."""
+        return [m['name'] for m in self.model_details()]
+    
+    @traced("http:tags")
+    def model_details(self) -> List[Dict[str, Any]]:
+        """List installed models with their size and details (parameter_size, quantization, ...)."""
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
+            response = self.session.get(f"{self.host}/api/tags", timeout=5)
             response.raise_for_status()
-            models = response.json().get('models', [])
-            return [m['name'] for m in models]
+            return response.json().get('models', [])
         except Exception as e:
-            logger.error(f"Failed to list models: {e}")
+            logger.error("Failed to list models: %s", e)
             return []
     
+    @traced("http:tags")
     def is_available(self) -> bool:
         """Check if Ollama is running and accessible."""
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
+            response = self.session.get(f"{self.host}/api/tags", timeout=5)
             return response.status_code == 200
         except Exception as e:
-            logger.warning(f"Ollama not available: {e}")
+            logger.warning("Ollama not available: %s", e)
+            return False
+    
+    def loaded_models(self) -> List[str]:
+        """List models currently loaded in Ollama's memory."""
+        try:
+            response = self.session.get(f"{self.host}/api/ps", timeout=5)
+            response.raise_for_status()
+            return [m['name'] for m in response.json().get('models', [])]
+        except Exception as e:
+            logger.warning("Failed to list loaded models: %s", e)
+            return []
+    
+    @traced("http:preload")
+    def preload(self, model: str = None) -> bool:
+        """
+        Load a model into memory without generating anything.
+        
+        Args:
+            model: Model to load (defaults to the active model)
+        
+        Returns:
+            True if the model is loaded
+        """
+        model = model or self.model
+        self._used.add(model)
+        try:
+            response = self.session.post(
+                self.api_endpoint,
+                json={"model": model, "keep_alive": config.keep_alive_for(model)},
+                timeout=600
+            )
+            response.raise_for_status()
+            logger.info("🔥 Model preloaded: %s", model)
+        except Exception as e:
+            logger.warning("Failed to preload %s: %s", model, e)
             return False
+        return True
     
-    def generate(self, prompt: str, model: str = None, stream: bool = False) -> str:
+    def preload_async(self, model: str = None) -> threading.Thread:
+        """Preload a model in a background thread."""
+        thread = threading.Thread(target=self.preload, args=(model,), daemon=True)
+        thread.start()
+        return thread
+    
+    def unload(self, model: str) -> bool:
+        """Ask Ollama to release a model's memory now."""
+        try:
+            response = self.session.post(
+                self.api_endpoint,
+                json={"model": model, "keep_alive": 0},
+                timeout=30
+            )
+            response.raise_for_status()
+            logger.info("💤 Model unloaded: %s", model)
+            return True
+        except Exception as e:
+            logger.warning("Failed to unload %s: %s", model, e)
+            return False
+    
+    def unload_unused(self, keep: List[str] = None) -> List[str]:
+        """
+        Unload models this client used that are still loaded and not in `keep`
+        (defaults to the active model). Models loaded by anyone else are left alone.
+        
+        Returns:
+            Names of the models that were unloaded
+        """
+        # Ollama lists loaded models with their tag: "mistral" is "mistral:latest"
+        tagged = lambda name: name if ":" in name else f"{name}:latest"
+        keep = {tagged(m) for m in keep or [self.model]}
+        used = {tagged(m) for m in self._used}
+        stale = [m for m in self.loaded_models() if tagged(m) in used and tagged(m) not in keep]
+        unloaded = [m for m in stale if self.unload(m)]
+        self._used -= {m for m in self._used if tagged(m) in {tagged(u) for u in unloaded}}
+        return unloaded
+    
+    def generate(self, prompt: str, model: str = None, stream: bool = False,
+                 options: Dict[str, Any] = None) -> str:
         """
         Generate text using Ollama.
         
@@ -42,68 +215,400 @@ class OllamaClient:
             prompt: The input prompt
             model: Optional model override
             stream: Whether to stream the response
+            options: Ollama generation options (num_ctx, num_predict, stop, temperature, ...)
         
         Returns:
             Generated text
         """
+        try:
+            return self.generate_stats(prompt, model, options)['response'].strip()
+        except Exception as e:
+            logger.error("Generation failed: %s", e)
+            return ""
+    
+    def generate_stats(self, prompt: str, model: str = None, options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Generate without streaming and return Ollama's full response.
+        
+        Returns:
+            Response dict: 'response' text plus timings (load_duration, prompt_eval_count,
+            prompt_eval_duration, eval_count, eval_duration; durations in nanoseconds)
+        
+        Raises:
+            requests.RequestException on connection or HTTP errors
+        """
         model = model or self.model
+        self._used.add(model)
+        options = self._stable_options(model, options or {})
         
-        try:
-            response = requests.post(
+        with self.limiter.slot() as slot, \
+                tracer.span("http:generate", model=model, prompt_chars=len(prompt)):
+            response = self.session.post(
                 self.api_endpoint,
-                json={"model": model, "prompt": prompt, "stream": False},
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": False,
+                    "keep_alive": config.keep_alive_for(model),
+                    "options": options,
+                },
                 timeout=30000
             )
             response.raise_for_status()
-            return response.json()['response'].strip()
-        except Exception as e:
-            logger.error(f"Generation failed: {e}")
-            return ""
+            data = response.json()
+            slot.record(data)
+            return data
+    
+    def stream(self, prompt: str, model: str = None, options: Dict[str, Any] = None,
+               cancel_event: threading.Event = None, stats: Dict[str, Any] = None) -> Iterator[str]:
+        """
+        Stream generated text chunk by chunk.
+        
+        Args:
+            prompt: The input prompt
+            model: Optional model override
+            options: Ollama generation options
+            cancel_event: When set, the HTTP stream is closed so Ollama stops generating (no
+                request is sent if it is set while waiting for a slot)
+            stats: Filled with the final chunk ('done' plus timings) if the generation completes;
+                left empty if the stream was cancelled or cut off
+        
+        Yields:
+            Response text chunks as they arrive
+        
+        Raises:
+            requests.RequestException on connection or HTTP errors
+        """
+        model = model or self.model
+        self._used.add(model)
+        options = self._stable_options(model, options or {})
+        
+        with self.limiter.slot() as slot, \
+                tracer.span("http:stream", model=model, prompt_chars=len(prompt)):
+            if cancel_event is not None and cancel_event.is_set():
+                return  # Cancelled while waiting for a slot: don't start a generation
+            with self.session.post(
+                self.api_endpoint,
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": True,
+                    "keep_alive": config.keep_alive_for(model),
+                    "options": options,
+                },
+                stream=True,
+                timeout=30000
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        slot.mark_first_token()
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        slot.record(chunk)
+                        if stats is not None:
+                            stats.update(chunk)
+                        break
+    
+    def _stable_options(self, model: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Round num_ctx up to the largest value already used for this model."""
+        if "num_ctx" not in options:
+            return options
+        num_ctx = max(options["num_ctx"], self._num_ctx.get(model, 0))
+        self._num_ctx[model] = num_ctx
+        return {**options, "num_ctx": num_ctx}
+    
+    def chat(self, messages: List[Dict[str, Any]], model: str = None, tools: List[Dict[str, Any]] = None,
+             options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Send a chat turn, optionally offering tools the model may call.
+        
+        Args:
+            messages: Conversation so far (role/content dicts)
+            model: Optional model override
+            tools: Tool definitions in Ollama's function-calling format
+            options: Ollama generation options
+        
+        Returns:
+            The assistant message (may contain 'tool_calls')
+        """
+        model = model or self.model
+        self._used.add(model)
+        options = self._stable_options(model, options or {})
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": config.keep_alive_for(model),
+            "options": options,
+        }
+        if tools:
+            payload["tools"] = tools
+        
+        with self.limiter.slot() as slot, tracer.span("http:chat", model=model, messages=len(messages)):
+            response = self.session.post(f"{self.host}/api/chat", json=payload, timeout=30000)
+            response.raise_for_status()
+            data = response.json()
+            slot.record(data)
+            return data.get('message', {})
+    
+    def embed(self, texts: List[str], model: str = None) -> List[List[float]]:
+        """
+        Embed texts with Ollama's /api/embed endpoint.
+        
+        Args:
+            texts: Texts to embed
+            model: Embedding model (defaults to config.embed_model)
+        
+        Returns:
+            One embedding vector per text
+        
+        Raises:
+            requests.RequestException on connection or HTTP errors
+        """
+        model = model or config.embed_model
+        with tracer.span("http:embed", model=model, texts=len(texts)):
+            response = self.session.post(
+                f"{self.host}/api/embed",
+                json={"model": model, "input": texts, "keep_alive": config.keep_alive_for(model)},
+                timeout=60
+            )
+            response.raise_for_status()
+            return response.json().get('embeddings', [])
     
     def set_model(self, model: str):
-        """Set the active model."""
+        """Set the active model, releasing the ones this client used before if configured to."""
+        previous = self.model
         self.model = model
-        logger.info(f"Model set to: {model}")
+        logger.info("Model set to: %s", model)
+        if self.unload_on_switch and previous != model:
+            self._used.add(previous)
+            threading.Thread(target=self.unload_unused, args=([model, config.embed_model],), daemon=True).start()
+
 
+CODE_BLOCK_PATTERN = re.compile(r'```([\w+-]*)\n(.*?)```', re.DOTALL)
 
-def think_prepare_implement(prompt: str, model: str = None, client: OllamaClient = None) -> Dict[str, str]:
+
+def is_valid_implementation(text: str) -> bool:
+    """
+    Check that an implementation contains code blocks and its Python blocks parse.
+    
+    Args:
+        text: Generated implementation
+    
+    Returns:
+        True if at least one fenced block exists and every python block is valid syntax
+    """
+    blocks = CODE_BLOCK_PATTERN.findall(text)
+    if not blocks:
+        return False
+    for language, code in blocks:
+        if language.lower() in ("python", "py"):
+            try:
+                ast.parse(code)
+            except SyntaxError:
+                return False
+    return True
+
+
+def race_generate(prompt: str, clients: List[OllamaClient], candidates: int, model: str = None,
+                  options: Dict[str, Any] = None,
+                  validator: Callable[[str], bool] = is_valid_implementation,
+                  cancel_event: threading.Event = None) -> str:
+    """
+    Generate several candidates concurrently and return the first valid one.
+    
+    Candidates are spread across `clients` (e.g. different Ollama hosts) and use
+    different seeds. As soon as one passes `validator` the others are cancelled,
+    closing their HTTP streams so the servers stop generating.
+    
+    Args:
+        prompt: The input prompt
+        clients: Clients to spread candidates across
+        candidates: Number of concurrent candidates
+        model: Optional model override
+        options: Base generation options
+        validator: Predicate deciding whether a completed candidate is usable
+        cancel_event: When set, every candidate is cancelled
+    
+    Returns:
+        The first valid candidate, or the first completed one if none validate
+    
+    Raises:
+        GenerationCancelled if `cancel_event` is set
+    """
+    cancel = threading.Event()
+    fallback = ""
+    
+    def run(index: int) -> Tuple[str, bool]:
+        """Generate one candidate: (text, whether the generation completed)."""
+        client = clients[index % len(clients)]
+        seeded = {**(options or {}), "seed": index + 1}
+        stats: Dict[str, Any] = {}
+        text = "".join(client.stream(prompt, model, seeded, cancel_event=cancel, stats=stats)).strip()
+        completed = bool(stats.get("done"))
+        if completed and validator(text):
+            # Cancel from the worker right away: candidates queued on the limiter take the
+            # freed slot next and must see the race is over before sending their request
+            cancel.set()
+        return text, completed
+    
+    pool = ThreadPoolExecutor(max_workers=candidates)
+    try:
+        futures = [pool.submit(contextvars.copy_context().run, run, i) for i in range(candidates)]
+        pending = set(futures)
+        while pending:
+            # Poll so a cancelled workflow stops its candidates too
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            _check_cancelled(cancel_event)
+            for future in sorted(done, key=futures.index):
+                try:
+                    text, completed = future.result()
+                except Exception as e:
+                    logger.warning("Race candidate failed: %s", e)
+                    continue
+                if not completed:
+                    continue  # Stopped by the race (or cut off): truncated text may look valid
+                if validator(text):
+                    logger.info("🏁 Race won by candidate %s/%s", futures.index(future) + 1, candidates)
+                    return text
+                fallback = fallback or text
+        logger.warning("No race candidate passed validation, using the first completed one")
+        return fallback
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _generate_step(client: OllamaClient, step: str, prompt: str, model: str, options: Dict[str, Any],
+                   cancel_event: threading.Event = None) -> str:
+    """
+    Generate one workflow step as a stream so it can be stopped mid-generation.
+    
+    Ctrl-C (KeyboardInterrupt) or `cancel_event` closes the HTTP stream, which makes
+    Ollama stop generating, and the text received so far is kept.
+    
+    Returns:
+        Generated text ("" if the request failed)
+    
+    Raises:
+        GenerationCancelled with the step name and partial text when stopped
+    """
+    chunks = []
+    try:
+        for chunk in client.stream(prompt, model, options, cancel_event=cancel_event):
+            chunks.append(chunk)
+    except KeyboardInterrupt:
+        raise GenerationCancelled("Interrupted", step=step, partial="".join(chunks).strip())
+    except requests.RequestException as e:
+        logger.error("Generation failed: %s", e)
+        return ""
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled("Cancelled", step=step, partial="".join(chunks).strip())
+    return "".join(chunks).strip()
+
+
+def think_prepare_implement(prompt: str, model: str = None, client: OllamaClient = None,
+                            on_step: Callable[[str, str], None] = None, race: int = None,
+                            cancel_event: threading.Event = None,
+                            checkpoint: Dict[str, str] = None,
+                            extra_context: Callable[[], str] = None,
+                            step_models: Dict[str, str] = None) -> Dict[str, str]:
     """
     Execute the think-prepare-implement workflow.
     
+    Args:
+        prompt: The task prompt
+        model: Optional model override
+        client: Client to use (a new one is created if omitted)
+        on_step: Optional callback invoked with (step_name, output) as each step completes
+        race: Implement-step candidates to race (defaults to config.race_candidates; <2 = off)
+        cancel_event: When set, the workflow stops (the running step's stream is closed)
+        checkpoint: Outputs of already completed steps ('thinking', 'plan'); those steps are skipped
+        extra_context: Called after the think step for reference material (e.g. prefetched
+            files and URLs) to include in the plan and implement prompts
+        step_models: Per-step model overrides keyed by step (think, prepare, implement)
+    
     Returns:
         Dictionary with 'thinking', 'plan', and 'implementation' keys
+    
+    Raises:
+        GenerationCancelled if `cancel_event` is set or on Ctrl-C (with the partial step output)
+        StepFailed if a step produces no output
     """
     if client is None:
         client = OllamaClient()
     
     model = model or client.model
+    step_models = step_models or {}
+    checkpoint = checkpoint or {}
     
     # Step 1: Think (analyze and understand)
-    think_prompt = f"""Analyze this request and break down what needs to be done:
-{prompt}
-
-Provide a clear analysis in 2-3 sentences."""
+    think_prompt = THINK_PROMPT.format(prompt=prompt)
+    
+    if checkpoint.get("thinking"):
+        thinking = checkpoint["thinking"]
+        logger.info("⏩ Thinking restored from checkpoint")
+    else:
+        _check_cancelled(cancel_event)
+        with tracer.span("step:think"):
+            thinking = _generate_step(client, "thinking", think_prompt, step_models.get("think", model),
+                                      generation_options("think", think_prompt), cancel_event)
+        _check_output("thinking", thinking)
+        logger.info("💭 Thinking: %.100s...", thinking)
+    if on_step:
+        on_step("thinking", thinking)
     
-    thinking = client.generate(think_prompt, model)
-    logger.info(f"💭 Thinking: {thinking[:100]}...")
+    # Reference material gathered while the think step was running
+    references = extra_context() if extra_context else ""
+    references = f"\n\nREFERENCED CONTENT:\n{references}" if references else ""
     
     # Step 2: Prepare (plan the implementation)
-    prepare_prompt = f"""Based on this analysis:
-{thinking}
-
-Create a detailed step-by-step plan to execute this request. Be specific and actionable."""
+    prepare_prompt = PREPARE_PROMPT.format(thinking=thinking, references=references)
     
-    plan = client.generate(prepare_prompt, model)
-    logger.info(f"📋 Plan: {plan[:100]}...")
+    if checkpoint.get("plan"):
+        plan = checkpoint["plan"]
+        logger.info("⏩ Plan restored from checkpoint")
+    else:
+        _check_cancelled(cancel_event)
+        with tracer.span("step:prepare"):
+            plan = _generate_step(client, "plan", prepare_prompt, step_models.get("prepare", model),
+                                  generation_options("prepare", prepare_prompt), cancel_event)
+        _check_output("plan", plan)
+        logger.info("📋 Plan: %.100s...", plan)
+    if on_step:
+        on_step("plan", plan)
     
     # Step 3: Implement (execute)
-    implement_prompt = f"""Following this plan:
-{plan}
-
-Now provide the implementation code, commands, or detailed steps to execute this. Be thorough and production-ready."""
+    implement_prompt = IMPLEMENT_PROMPT.format(plan=plan, references=references)
     
-    implementation = client.generate(implement_prompt, model)
-    logger.info(f"✅ Implementation: {implementation[:100]}...")
+    _check_cancelled(cancel_event)
+    race = config.race_candidates if race is None else race
+    implement_options = generation_options("implement", implement_prompt)
+    model = step_models.get("implement", model)
+    with tracer.span("step:implement", race=race):
+        if race and race > 1:
+            extra = [OllamaClient(host=host, model=client.model) for host in config.race_hosts]
+            try:
+                implementation = race_generate(implement_prompt, [client] + extra, race, model,
+                                               implement_options, cancel_event=cancel_event)
+            except KeyboardInterrupt:
+                raise GenerationCancelled("Interrupted", step="implementation")  # Candidates' streams are closed
+            finally:
+                for other in extra:
+                    other.session.close()
+        else:
+            implementation = _generate_step(client, "implementation", implement_prompt, model,
+                                            implement_options, cancel_event)
+    _check_output("implementation", implementation)
+    logger.info("✅ Implementation: %.100s...", implementation)
+    if on_step:
+        on_step("implementation", implementation)
     
     return {
         "thinking": thinking,
@@ -0,0 +1,114 @@
+import re
+import logging
+import contextvars
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Dict, List, Tuple
+from file_manager import FileManager
+from web_client import WebClient
+from config import config
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r'https?://[^\s<>()\[\]"\'`]+')
+PATH_PATTERN = re.compile(r'(?<![\w/.:-])((?:[\w.-]+/)*[\w-]+\.[A-Za-z0-9]{1,8})\b')
+
+# Per-item and total characters of prefetched content added to prompts
+ITEM_LIMIT = 4000
+TOTAL_LIMIT = 12000
+
+
+def _html_to_text(html: str) -> str:
+    """Crude HTML to text: drop scripts/styles and tags, collapse whitespace."""
+    text = re.sub(r'(?is)<(script|style)[^>]*>.*?</\1>', ' ', html)
+    text = re.sub(r'(?s)<[^>]+>', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def find_references(prompt: str, workspace: str = ".", max_items: int = 8) -> List[Tuple[str, str]]:
+    """
+    Find URLs and existing workspace files mentioned in a prompt.
+
+    Returns:
+        List of (kind, target) tuples, kind being 'url' or 'file'
+    """
+    references = []
+    seen = set()
+
+    for url in URL_PATTERN.findall(prompt):
+        url = url.rstrip('.,;:!?')
+        if url not in seen:
+            seen.add(url)
+            references.append(("url", url))
+
+    root = Path(workspace).resolve()
+    without_urls = URL_PATTERN.sub(' ', prompt)
+    for candidate in PATH_PATTERN.findall(without_urls):
+        path = (root / candidate).resolve()
+        if candidate in seen or root not in path.parents or not path.is_file():
+            continue
+        seen.add(candidate)
+        references.append(("file", candidate))
+
+    return references[:max_items]
+
+
+class Prefetcher:
+    """Fetch URLs and files referenced by a prompt in the background."""
+
+    def __init__(self, prompt: str, workspace: str = "."):
+        self.workspace = workspace
+        self.references = find_references(prompt, workspace)
+        self._futures: Dict[Tuple[str, str], Future] = {}
+        self._pool = None
+
+    def start(self) -> "Prefetcher":
+        """Start fetching every reference concurrently."""
+        if not self.references:
+            return self
+        logger.info("📥 Prefetching %d reference(s)", len(self.references))
+        self._pool = ThreadPoolExecutor(max_workers=len(self.references), thread_name_prefix="prefetch")
+        for kind, target in self.references:
+            self._futures[(kind, target)] = self._pool.submit(contextvars.copy_context().run,
+                                                                 self._fetch, kind, target)
+        self._pool.shutdown(wait=False)
+        return self
+
+    def _fetch(self, kind: str, target: str) -> str:
+        with tracer.span(f"prefetch:{kind}", target=target):
+            if kind == "url":
+                content = WebClient.fetch(target)
+                return _html_to_text(content) if content and "<" in content else (content or "")
+            return FileManager.read_file(str(Path(self.workspace) / target)) or ""
+
+    def context(self, timeout: float = None) -> str:
+        """
+        Wait for prefetched content and format it for inclusion in a prompt.
+
+        Args:
+            timeout: Seconds to wait for outstanding fetches (defaults to config.prefetch_timeout)
+
+        Returns:
+            Formatted content, or "" if nothing was fetched
+        """
+        if not self._futures:
+            return ""
+
+        with tracer.span("prefetch:wait"):
+            wait(self._futures.values(), timeout=config.prefetch_timeout if timeout is None else timeout)
+
+        sections = []
+        total = 0
+        for (kind, target), future in self._futures.items():
+            if not future.done() or future.exception() or not future.result():
+                logger.warning("Prefetch unavailable: %s", target)
+                continue
+            content = future.result()[:ITEM_LIMIT]
+            if total + len(content) > TOTAL_LIMIT:
+                break
+            total += len(content)
+            label = "URL" if kind == "url" else "FILE"
+            sections.append(f"--- {label}: {target} ---\n{content}")
+
+        return "\n\n".join(sections)
@@ -0,0 +1,195 @@
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from config import config
+from tracing import tracer
+from atomic_write import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Result fields worth reusing (everything else is per-run metadata)
+CACHED_FIELDS = ("thinking", "plan", "implementation")
+
+# Above this similarity a new entry replaces the old one instead of adding a duplicate
+DUPLICATE_SIMILARITY = 0.995
+
+
+class SemanticCache:
+    """
+    Reuse results of previous prompts that mean nearly the same thing.
+
+    Prompts are embedded with Ollama's embedding model and compared by cosine
+    similarity against a NumPy matrix of earlier prompts. Entries are scoped (e.g.
+    per generation model and mode), persisted under the state directory, and the
+    least recently used ones are evicted beyond `max_entries` per scope; beyond
+    `max_scopes`, the least recently written scopes are dropped whole.
+    """
+
+    def __init__(self, directory: Path = None, threshold: float = None, max_entries: int = None,
+                 embed_model: str = None, max_scopes: int = None):
+        """
+        Args:
+            directory: Where cache files live (defaults to state_dir/semantic_cache)
+            threshold: Minimum cosine similarity for a hit (defaults to config.semantic_cache_threshold)
+            max_entries: Entries kept per scope (defaults to config.semantic_cache_size)
+            embed_model: Ollama embedding model (defaults to config.embed_model)
+            max_scopes: Scopes kept on disk (defaults to config.semantic_cache_scopes)
+        """
+        self.directory = Path(directory or config.state_dir / "semantic_cache")
+        self.threshold = config.semantic_cache_threshold if threshold is None else threshold
+        self.max_entries = max_entries or config.semantic_cache_size
+        self.embed_model = embed_model or config.embed_model
+        self.max_scopes = max_scopes or config.semantic_cache_scopes
+        # scope -> (normalized vectors, entries, mtime of the entries file when loaded)
+        self._scopes: Dict[str, Tuple[np.ndarray, List[Dict[str, Any]], float]] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, client, text: str) -> Optional[np.ndarray]:
+        """
+        Embed a prompt (unit length), or return None if the embedding model is unavailable.
+
+        Args:
+            client: OllamaClient used to call the embedding endpoint
+            text: Prompt to embed
+        """
+        try:
+            vector = np.asarray(client.embed([text], self.embed_model)[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning("Semantic cache disabled for this prompt (embedding failed: %s)", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, vector: np.ndarray, scope: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar cached prompt in a scope.
+
+        Returns:
+            Dict with 'prompt', 'similarity', 'created' and 'result' if the best match
+            reaches the threshold, otherwise None
+        """
+        with self._lock, tracer.span("cache:lookup", scope=scope):
+            vectors, entries, _ = self._load(scope)
+            if not entries or vectors.shape[1] != vector.shape[0]:
+                return None
+            similarities = vectors @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                return None
+
+            entry = entries[best]
+            entry["last_used"] = datetime.now().isoformat()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self._save(scope)
+            return {"prompt": entry["prompt"], "similarity": round(similarity, 4),
+                    "created": entry["created"], "result": dict(entry["result"])}
+
+    def add(self, vector: np.ndarray, prompt: str, scope: str, result: Dict[str, Any]):
+        """Store a successful result for a prompt, evicting least recently used entries."""
+        cached = {k: result[k] for k in CACHED_FIELDS if isinstance(result.get(k), str) and result[k]}
+        if not cached:
+            return
+        now = datetime.now().isoformat()
+        entry = {"prompt": prompt, "result": cached, "created": now, "last_used": now, "hits": 0}
+
+        with self._lock:
+            vectors, entries, mtime = self._load(scope)
+            if entries and vectors.shape[1] != vector.shape[0]:
+                vectors, entries = np.empty((0, vector.shape[0]), dtype=np.float32), []  # Embedding model changed
+            if entries and float(np.max(vectors @ vector)) >= DUPLICATE_SIMILARITY:
+                index = int(np.argmax(vectors @ vector))
+                vectors[index] = vector
+                entries[index] = entry
+            else:
+                vectors = np.vstack([vectors.reshape(-1, vector.shape[0]), vector[None, :]])
+                entries = entries + [entry]
+
+            if len(entries) > self.max_entries:
+                order = sorted(range(len(entries)), key=lambda i: entries[i]["last_used"])
+                drop = set(order[:len(entries) - self.max_entries])
+                keep = [i for i in range(len(entries)) if i not in drop]
+                vectors, entries = vectors[keep], [entries[i] for i in keep]
+                logger.debug("Semantic cache evicted %d entr%s from %s", len(drop), 'y' if len(drop) == 1 else 'ies', scope)
+
+            self._scopes[scope] = (vectors, entries, mtime)
+            self._save(scope)
+            self._prune_scopes()
+
+    def _prune_scopes(self):
+        """Drop the least recently written scopes beyond max_scopes (caller holds the lock)."""
+        def written(path: Path) -> float:
+            try:
+                return path.stat().st_mtime
+            except FileNotFoundError:
+                return 0.0  # Pruned concurrently by another process
+
+        scopes = sorted(self.directory.glob("*.json"), key=written, reverse=True)
+        for entries_path in scopes[self.max_scopes:]:
+            entries_path.with_suffix(".npy").unlink(missing_ok=True)
+            entries_path.unlink(missing_ok=True)
+        if len(scopes) > self.max_scopes:
+            logger.debug("Semantic cache dropped %d scope(s)", len(scopes) - self.max_scopes)
+            self._scopes = {scope: index for scope, index in self._scopes.items()
+                            if self._paths(scope)[1].exists()}
+
+    def clear(self):
+        """Delete every cached entry."""
+        with self._lock:
+            self._scopes.clear()
+            if self.directory.exists():
+                for path in self.directory.iterdir():
+                    path.unlink()
+
+    def _paths(self, scope: str) -> Tuple[Path, Path]:
+        key = hashlib.sha1(f"{self.embed_model}|{scope}".encode()).hexdigest()[:16]
+        return self.directory / f"{key}.npy", self.directory / f"{key}.json"
+
+    def _load(self, scope: str) -> Tuple[np.ndarray, List[Dict[str, Any]], float]:
+        """Return a scope's index, reloading it if another process has rewritten it."""
+        vectors_path, entries_path = self._paths(scope)
+        mtime = entries_path.stat().st_mtime if entries_path.exists() else 0.0
+        if scope in self._scopes and self._scopes[scope][2] == mtime:
+            return self._scopes[scope]
+
+        vectors, entries = np.empty((0, 0), dtype=np.float32), []
+        if mtime:
+            try:
+                with open(entries_path, 'r') as f:
+                    entries = json.load(f)["entries"]
+                vectors = np.load(vectors_path)
+                if len(vectors) != len(entries):
+                    raise ValueError("index and entries out of sync")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Semantic cache for %s unreadable, starting empty: %s", scope, e)
+                vectors, entries = np.empty((0, 0), dtype=np.float32), []
+        self._scopes[scope] = (vectors, entries, mtime)
+        return self._scopes[scope]
+
+    def _save(self, scope: str):
+        vectors, entries, _ = self._scopes[scope]
+        vectors_path, entries_path = self._paths(scope)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Vectors first, then entries: the entries file's mtime marks a complete update
+        write_atomic(vectors_path, lambda f: np.save(f, vectors))
+        write_atomic(entries_path, json.dumps(
+            {"scope": scope, "embed_model": self.embed_model, "entries": entries}).encode())
+        self._scopes[scope] = (vectors, entries, entries_path.stat().st_mtime)
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SemanticCache:
+    """The process-wide semantic cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
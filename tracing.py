@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Any, List
+
+
+class Tracer:
+    """Record hierarchical wall-time spans in Chrome trace event format."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # Open span names per thread / asyncio task (context variables cover both)
+        self._stack: contextvars.ContextVar = contextvars.ContextVar("trace_stack", default=())
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        """Start recording spans."""
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **args):
+        """
+        Context manager timing a block of work.
+
+        Args:
+            name: Span name shown in the trace viewer
+            **args: Extra attributes attached to the span
+
+        Returns:
+            A context manager; a no-op one when tracing is disabled
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._record(name, args)
+
+    @contextmanager
+    def _record(self, name: str, args: Dict[str, Any]):
+        stack = self._stack.get()
+        depth = len(stack)
+        token = self._stack.set(stack + (name,))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            try:
+                self._stack.reset(token)
+            except ValueError:
+                self._stack.set(stack)  # Closed from another context (e.g. an async generator finalizer)
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {**args, "depth": depth},
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def write(self, path: str):
+        """Write recorded spans as a JSON trace (chrome://tracing, Perfetto, speedscope)."""
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e["ts"])
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self) -> str:
+        """Render spans as an indented tree with wall times."""
+        with self._lock:
+            events = sorted(self.events, key=lambda e: (e["tid"], e["ts"]))
+        lines = []
+        for event in events:
+            indent = "  " * event["args"]["depth"]
+            lines.append(f"{indent}{event['name']:<{40 - len(indent)}} {event['dur'] / 1000:10.2f} ms")
+        return "\n".join(lines)
+
+
+def traced(name: str = None):
+    """Decorator wrapping a function call in a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+tracer = Tracer()
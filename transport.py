@@ -0,0 +1,289 @@
+"""
+HTTP transport with record/replay support.
+
+Every `requests` session used by OllamaClient, WebClient and AgentPool is created
+with new_session(), which mounts CassetteAdapter. With no cassette configured the
+adapter is a plain HTTPAdapter. In record mode each interaction (request, status,
+headers and body chunks with their arrival times) is appended to a JSON-lines
+cassette as it completes; in replay mode responses are served from the cassette,
+either instantly or with the recorded timing, so whole Agent.execute flows rerun
+offline in milliseconds.
+"""
+
+import re
+import json
+import time
+import base64
+import logging
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Recorded bodies are stored decoded, so these no longer describe them on replay
+_STRIP_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+# Final chunk of an Ollama stream; clients close the response after it without reading to EOF
+_DONE_CHUNK = re.compile(rb'"done"\s*:\s*true')
+
+
+def _request_key(method: str, url: str, body: Optional[str]) -> Tuple[str, str, str]:
+    """Match key for a request: JSON bodies are compared canonically."""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            pass
+    return method.upper(), url, body or ""
+
+
+def _body_text(request: requests.PreparedRequest) -> str:
+    body = request.body or ""
+    return body.decode('utf-8', errors='replace') if isinstance(body, bytes) else body
+
+
+def _encode_chunk(data: bytes) -> Dict[str, Any]:
+    try:
+        return {"text": data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode('ascii')}
+
+
+def _decode_chunk(chunk: Dict[str, Any]) -> bytes:
+    if "b64" in chunk:
+        return base64.b64decode(chunk["b64"])
+    return chunk["text"].encode('utf-8')
+
+
+class Cassette:
+    """A JSON-lines file of recorded HTTP interactions."""
+
+    def __init__(self, path: Path, mode: str, timing: str = "none"):
+        """
+        Args:
+            path: Cassette file
+            mode: "record" (append live interactions) or "replay" (serve recorded ones)
+            timing: On replay, "none" returns bodies instantly, "recorded" reproduces
+                the recorded time-to-first-byte and chunk pacing
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._interactions: List[Dict[str, Any]] = []
+        self._used: List[bool] = []
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _load(self):
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with open(self.path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    request = interaction["request"]
+                    interaction["key"] = _request_key(request["method"], request["url"], request.get("body"))
+                    self._interactions.append(interaction)
+        self._used = [False] * len(self._interactions)
+        logger.info("📼 Replaying %d interaction(s) from %s", len(self._interactions), self.path)
+
+    def append(self, interaction: Dict[str, Any]):
+        """Write one completed interaction."""
+        line = json.dumps(interaction) + "\n"
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+    def find(self, request: requests.PreparedRequest) -> Optional[Dict[str, Any]]:
+        """
+        Pick the recorded interaction for a request.
+
+        Identical requests are served in recording order (the last one repeats once
+        all are used). A request with no exact match falls back to the next unused
+        interaction for the same method and URL, so runs whose prompts differ slightly
+        (e.g. a different working directory in the context) still replay.
+        """
+        key = _request_key(request.method, request.url, _body_text(request))
+        with self._lock:
+            exact = [i for i, interaction in enumerate(self._interactions) if interaction["key"] == key]
+            if not exact:
+                exact = [i for i, interaction in enumerate(self._interactions)
+                         if interaction["key"][:2] == key[:2] and not self._used[i]]
+                if exact:
+                    logger.debug("No exact recording for %s %s, using the next in order", request.method, request.url)
+            if not exact:
+                return None
+            index = next((i for i in exact if not self._used[i]), exact[-1])
+            self._used[index] = True
+            return self._interactions[index]
+
+
+class _RecordingBody:
+    """Wrap a urllib3 response body, capturing chunks as the client reads them."""
+
+    def __init__(self, raw, on_complete, start: float):
+        self._raw = raw
+        self._on_complete = on_complete
+        self._start = start  # Request send time, so chunk times include time-to-first-byte
+        self._chunks: List[Dict[str, Any]] = []
+        self._finished = False
+        self._done_seen = False
+
+    def _capture(self, data: bytes):
+        if data:
+            self._done_seen = self._done_seen or bool(_DONE_CHUNK.search(data))
+            self._chunks.append({"t": round(time.perf_counter() - self._start, 4), **_encode_chunk(data)})
+
+    def _finish(self, partial: bool):
+        if not self._finished:
+            self._finished = True
+            self._on_complete(self._chunks, partial)
+
+    def stream(self, amt: int = 2 ** 16, decode_content: bool = None):
+        for data in self._raw.stream(amt, decode_content=True):
+            self._capture(data)
+            yield data
+        self._finish(partial=False)
+
+    def read(self, amt: int = None, decode_content: bool = None, **kwargs) -> bytes:
+        data = self._raw.read(amt, decode_content=True, **kwargs)
+        self._capture(data)
+        if not data or amt is None:
+            self._finish(partial=False)
+        return data
+
+    def close(self):
+        # Closed before EOF: complete if the stream's final chunk arrived, else cancelled midway
+        self._finish(partial=not self._done_seen)
+        self._raw.close()
+
+    def release_conn(self):
+        self._raw.release_conn()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _ReplayBody:
+    """Serve recorded chunks, optionally at their recorded times."""
+
+    def __init__(self, chunks: List[Dict[str, Any]], timing: str):
+        self._chunks = chunks
+        self._timing = timing
+        self._start = time.perf_counter()
+        self._position = 0
+        self.closed = False
+
+    def _next(self) -> bytes:
+        if self.closed or self._position >= len(self._chunks):
+            return b""
+        chunk = self._chunks[self._position]
+        self._position += 1
+        if self._timing == "recorded":
+            delay = chunk["t"] - (time.perf_counter() - self._start)
+            if delay > 0:
+                time.sleep(delay)
+        return _decode_chunk(chunk)
+
+    def stream(self, amt: int = 2 ** 16, decode_content: bool = None):
+        while True:
+            data = self._next()
+            if not data:
+                return
+            yield data
+
+    def read(self, amt: int = None, decode_content: bool = None, **kwargs) -> bytes:
+        if amt is not None:
+            return self._next()
+        return b"".join(self.stream())
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class CassetteAdapter(HTTPAdapter):
+    """HTTPAdapter that records to or replays from the configured cassette."""
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs) -> requests.Response:
+        cassette = active_cassette()
+        if cassette is None:
+            return super().send(request, stream=stream, **kwargs)
+        if cassette.mode == "replay":
+            return self._replay(cassette, request)
+
+        started = time.time()
+        start = time.perf_counter()
+        response = super().send(request, stream=stream, **kwargs)
+
+        def on_complete(chunks: List[Dict[str, Any]], partial: bool):
+            cassette.append({
+                "request": {"method": request.method, "url": request.url, "body": _body_text(request)},
+                "response": {
+                    "status": response.status_code,
+                    "reason": response.reason,
+                    "headers": {k: v for k, v in response.headers.items() if k.lower() not in _STRIP_HEADERS},
+                    "chunks": chunks,
+                },
+                "partial": partial,
+                "recorded_at": started,
+            })
+
+        response.raw = _RecordingBody(response.raw, on_complete, start)
+        return response
+
+    def _replay(self, cassette: Cassette, request: requests.PreparedRequest) -> requests.Response:
+        interaction = cassette.find(request)
+        if interaction is None:
+            raise requests.ConnectionError(f"No recorded interaction for {request.method} {request.url}",
+                                           request=request)
+        recorded = interaction["response"]
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded.get("reason", "")
+        response.headers = CaseInsensitiveDict(recorded.get("headers", {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _ReplayBody(recorded.get("chunks", []), cassette.timing)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(0)
+        return response
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def active_cassette() -> Optional[Cassette]:
+    """The cassette selected by config (AGENT_CASSETTE / --record / --replay), or None."""
+    global _cassette
+    if not config.cassette:
+        return None
+    with _cassette_lock:
+        if _cassette is None or (_cassette.path, _cassette.mode) != (Path(config.cassette), config.cassette_mode):
+            _cassette = Cassette(config.cassette, config.cassette_mode, config.replay_timing)
+        return _cassette
+
+
+def new_session() -> requests.Session:
+    """A requests session routed through the record/replay transport."""
+    session = requests.Session()
+    adapter = CassetteAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -1,15 +1,20 @@
-import requests
 import logging
 from typing import Dict, Any, Optional
 from urllib.parse import urljoin
+from tracing import traced
+from transport import new_session
 
 logger = logging.getLogger(__name__)
 
+# Shared session so repeated fetches reuse pooled connections
+_session = new_session()
+
 
 class WebClient:
     """Client for web access and searching."""
     
     @staticmethod
+    @traced("http:fetch")
     def fetch(url: str, timeout: int = 10) -> Optional[str]:
         """
         Fetch content from a URL.
@@ -25,14 +30,15 @@ class WebClient:
             headers = {
                 'User-Agent': 'CLIAgent/1.0'
             }
-            response = requests.get(url, headers=headers, timeout=timeout)
+            response = _session.get(url, headers=headers, timeout=timeout)
             response.raise_for_status()
             return response.text
         except Exception as e:
-            logger.error(f"Failed to fetch {url}: {e}")
+            logger.error("Failed to fetch %s: %s", url, e)
             return None
     
     @staticmethod
+    @traced("http:search")
     def search(query: str) -> Optional[str]:
         """
         Search the web (basic implementation with DuckDuckGo).
@@ -49,10 +55,10 @@ class WebClient:
             headers = {
                 'User-Agent': 'CLIAgent/1.0'
             }
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = _session.get(url, params=params, headers=headers, timeout=10)
             response.raise_for_status()
-            logger.info(f"Search results fetched for: {query}")
+            logger.info("Search results fetched for: %s", query)
             return response.text[:5000]  # Limit response size
         except Exception as e:
-            logger.error(f"Search failed: {e}")
+            logger.error("Search failed: %s", e)
             return None